@@ -1,31 +1,21 @@
-import warnings
-
-warnings.filterwarnings("ignore",
-                        message="builtin type (SwigPyPacked|SwigPyObject|swigvarlink) has no __module__ attribute",
-                        category=DeprecationWarning)
-
 # ==== Imports ====
 import os
-import tempfile
-import tiktoken
 from PIL import Image
-from markitdown import MarkItDown
-from openai import OpenAI
-from llama_parse import LlamaParse
 import streamlit as st
 import time
+import uuid
 from datetime import datetime
-import matplotlib.pyplot as plt
-import plotly.express as px
-import plotly.graph_objects as go
-import pandas as pd
-import re
-import json
-
-# ==== Config ====
-LLAMA_API = os.getenv("LLAMA_API_PARSE")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-LLM_MODEL = "gpt-4.1-mini"
+
+from core import (plan_rag, rag, RagStream, RagSession, create_visualization, get_answer_cache, content_hash,
+                  usage_totals, stage_summary, render_prometheus, start_metrics_server,
+                  submit_job, get_job, extraction_job, reorganize_job, prefetch_job, chart_hash, span, record_span,
+                  get_page_index, page_of, page_text, search_document, answer_from_tables,
+                  build_table_index, get_document_store, rag_documents, set_request_session,
+                  SessionBlobs, get_session_store, discard_job, document_id, workspace_owner)
+from core.config import SESSION_HISTORY_IN_MEMORY, DOCUMENT_LIBRARY_WORKSPACE
+from core.telemetry import SPANS
+
+_rerun_started = time.perf_counter()
 
 # ==== Page Configuration ====
 st.set_page_config(
@@ -34,6 +24,25 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+start_metrics_server()
+
+def bind_request_session():
+    """Queue this session's API requests separately in the shared scheduler (call again in fragments)"""
+    if "request_session" not in st.session_state:
+        st.session_state["request_session"] = uuid.uuid4().hex
+    set_request_session(st.session_state["request_session"])
+
+bind_request_session()
+
+def session_blobs() -> SessionBlobs:
+    """This session's large values (texts, indexes, tables), spilled to disk under a shared memory budget"""
+    if "blobs" not in st.session_state:
+        st.session_state["blobs"] = SessionBlobs()
+    return st.session_state["blobs"]
+
+def document_text() -> str | None:
+    """The organized content when there is one, else the raw extracted content"""
+    return session_blobs().get("organized_text") or session_blobs().get("raw_text")
 
 # ==== Custom CSS ====
 st.markdown("""
@@ -140,6 +149,55 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# ==== Document Library ====
+
+def library_owner() -> str | None:
+    """Whose library this session uses: the signed-in user, else the configured workspace.
+
+    None (an anonymous visitor and no workspace configured) means no library: nothing is stored.
+    """
+    try:
+        if st.user.is_logged_in:
+            return f"user:{st.user.get('email') or st.user.get('sub')}"
+    except Exception:  # authentication is not configured
+        pass
+    return workspace_owner(DOCUMENT_LIBRARY_WORKSPACE) if DOCUMENT_LIBRARY_WORKSPACE else None
+
+def document_store():
+    """The persistent document store, or None when the session has no library or the store is not usable"""
+    if library_owner() is None:
+        return None
+    try:
+        return get_document_store()
+    except Exception as e:
+        print(f"[⚠️] Document store unavailable: {e}")
+        return None
+
+def open_document(doc_id: str):
+    """Load a stored document into the session without re-extracting, reorganizing or embedding it"""
+    document = document_store().load_document(library_owner(), doc_id)
+    if document is None:
+        return
+    text = document["organized_text"] or document["raw_text"]
+    st.session_state["doc_id"] = doc_id
+    st.session_state["doc_name"] = document["name"]
+    docs = session_blobs()
+    docs["raw_text"] = document["raw_text"]
+    if document["organized_text"]:
+        docs["organized_text"] = document["organized_text"]
+    else:
+        docs.discard("organized_text")
+    docs["doc_index"] = document["index"]
+    docs["doc_tables"] = build_table_index(text)
+    docs.discard("compaction")     # a stored document keeps only its compacted text
+    st.session_state["content_hash"] = content_hash(text)
+    docs.discard("qa_history")
+    st.session_state["qa_history"] = document["qa_history"]
+    st.session_state["qa_archived"] = 0
+    trim_history()
+    for key in ("rag_session", "extraction_job", "reorganize_job"):
+        st.session_state.pop(key, None)
+
 # ==== Sidebar ====
 with st.sidebar:
     # Logo section
@@ -184,6 +242,10 @@ with st.sidebar:
         st.session_state.files_processed = 0
     if "questions_answered" not in st.session_state:
         st.session_state.questions_answered = 0
+    if "answer_cache_hits" not in st.session_state:
+        st.session_state.answer_cache_hits = 0
+    if "answer_cache_misses" not in st.session_state:
+        st.session_state.answer_cache_misses = 0
     
     # Display metrics
     col1, col2 = st.columns(2)
@@ -192,6 +254,53 @@ with st.sidebar:
     with col2:
         st.metric("Questions Answered", st.session_state.questions_answered)
     
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Answer Cache Hits", st.session_state.answer_cache_hits)
+    with col2:
+        st.metric("Answer Cache Misses", st.session_state.answer_cache_misses)
+    
+    totals = usage_totals()
+    if totals["prompt_tokens"]:
+        st.metric("Prompt Tokens Cached", f"{totals['cached_tokens'] / totals['prompt_tokens']:.0%}",
+                  help="Share of prompt tokens served from the provider's prompt cache (all sessions)")
+    
+    # Add some spacing
+    st.markdown("---")
+    
+    # Response settings
+    st.markdown("#### ⚙️ Settings")
+    st.toggle("⚡ Stream responses", value=True, key="stream_responses",
+              help="Show answers and reorganized content as they are generated")
+    st.toggle("🧠 Session mode", value=False, key="session_mode",
+              help="Send the full document as a fixed prompt prefix and keep the conversation, "
+                   "so follow-up questions reuse the provider's prompt cache")
+    st.toggle("🚀 Prefetch quick actions", value=False, key="prefetch_quick_actions",
+              help="Answer the Quick Actions in the background as soon as a document is ready, "
+                   "so they display instantly when clicked")
+    st.toggle("⏱️ Profiling panel", value=False, key="show_profiling",
+              help="Show per-stage latency and token metrics at the bottom of the page")
+    
+    # Stored documents
+    store = document_store()
+    stored_documents = store.list_documents(library_owner()) if store else []
+    if stored_documents:
+        st.markdown("---")
+        st.markdown("#### 📚 Document Library")
+        names = {doc["id"]: f"{doc['name']}{' ✨' if doc['organized'] else ''}" for doc in stored_documents}
+        selected = st.selectbox("Stored documents:", list(names), format_func=names.get, key="library_document")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("📂 Open", use_container_width=True, on_click=open_document, args=(selected,))
+        # Only a personal library can be pruned from the app; a shared workspace is managed by its admins
+        if library_owner().startswith("user:"):
+            with col2:
+                if st.button("🗑️ Delete", use_container_width=True):
+                    store.delete_document(library_owner(), selected)
+                    if st.session_state.get("doc_id") == selected:
+                        del st.session_state["doc_id"]
+                    st.rerun()
+    
     # Add some spacing
     st.markdown("---")
     
@@ -243,395 +352,472 @@ if uploaded_file:
 
 st.markdown('</div>', unsafe_allow_html=True)
 
-#####################################
-# ==== Functions ====
-#####################################
+# ==== Answering ====
 
-def convert_file(path: str) -> str:
-    """Convert file to text (prefer structured, fallback to OCR)"""
-    ext = os.path.splitext(path)[1].lower()
-    try:
-        print("[🔍] Trying structured text extraction via MarkItDown...")
-        md = MarkItDown(enable_plugins=False)
-        result = md.convert(path)
-        if result.text_content.strip():
-            print(f"[✔] Markdown extracted.")
-            return result.text_content
+def answer_question(question: str, content: str, spinner_text: str) -> tuple[str, dict]:
+    """Answer from the answer cache, the document's tables, the session conversation or rag(), rendering as it goes"""
+    if st.session_state.session_mode:
+        # Session answers depend on the conversation so far: never shared, and every turn is recorded
+        return generate_answer(question, content, spinner_text)
+    cache = get_answer_cache()
+    if cache.in_flight(st.session_state["content_hash"], question):
+        with st.spinner("⏳ Another session is asking the same question, waiting for its answer..."):
+            cache.wait_for(st.session_state["content_hash"], question)
+    cached = cache.get(st.session_state["content_hash"], question)
+    if cached:
+        answer, chart_data = cached["answer"], cached["chart_data"]
+        st.markdown(f"**A:** {answer}")
+        st.caption("⚡ Answered from cache")
+        st.session_state.answer_cache_hits += 1
+        return answer, chart_data
+    
+    with cache.computing(st.session_state["content_hash"], question):
+        answer, chart_data = generate_answer(question, content, spinner_text)
+        cache.put(st.session_state["content_hash"], question, answer, chart_data)
+    st.session_state.answer_cache_misses += 1
+    return answer, chart_data
+
+def generate_answer(question: str, content: str, spinner_text: str) -> tuple[str, dict]:
+    """Tables, session conversation or rag(), rendering the answer as it is generated"""
+    session, session_fits = None, True
+    if st.session_state.session_mode:
+        session_fits = plan_rag(content)["strategy"] == "direct"
+        session = st.session_state.get("rag_session")
+        if session is None or st.session_state.get("rag_session_hash") != st.session_state["content_hash"]:
+            session = st.session_state["rag_session"] = RagSession()
+            st.session_state["rag_session_hash"] = st.session_state["content_hash"]
+    
+    with st.spinner(spinner_text):
+        computed = answer_from_tables(question, session_blobs().get("doc_tables"))
+    if computed:
+        answer, chart_data = computed
+        st.markdown(f"**A:** {answer}")
+        st.caption("📊 Computed from the document's tables")
+        if session:
+            session.record(question, answer)    # follow-up questions may refer to it
+        return answer, chart_data
+    
+    if not session_fits:
+        st.caption("📏 Document is too large for session mode, answering from the most relevant sections")
+        session = None
+    
+    if st.session_state.stream_responses:
+        if session:
+            response_stream = session.stream(content, question)
         else:
-            print("[⚠️] No structured text found. Fallback to OCR...")
-    except Exception:
-        print(f"[❌] MarkItDown failed. Fallback to OCR...")
+            response_stream = RagStream(content, question, index=session_blobs().get("doc_index"))
+        st.write_stream(response_stream)
+        answer, chart_data = response_stream.answer, response_stream.chart_data
+    else:
+        with st.spinner(spinner_text):
+            if session:
+                answer, chart_data = session.ask(content, question)
+            else:
+                answer, chart_data = rag(content, question, index=session_blobs().get("doc_index"))
+        st.markdown(f"**A:** {answer}")
+    
+    return answer, chart_data
 
-    print("[🔍] OCR Started...")
-    try:
-        parser = LlamaParse(api_key=LLAMA_API, result_type="markdown")
-        documents = parser.load_data(path)
+# ==== Background Jobs ====
 
-        if not documents:
-            st.error("Failed to parse the document - no content returned")
-            return ""
+def finished_job(state_key: str):
+    """Pop and return the session's job under state_key once it has finished"""
+    job = get_job(st.session_state.get(state_key))
+    if job is None:
+        st.session_state.pop(state_key, None)
+        return None
+    if job.running:
+        return None
+    del st.session_state[state_key]
+    discard_job(job.id)
+    return job
 
-        return documents[0].text
+def job_running(state_key: str) -> bool:
+    """Whether the session's job under state_key is still queued or running"""
+    job = get_job(st.session_state.get(state_key))
+    return job is not None and job.running
 
-    except Exception as e:
-        st.error(f"Error parsing document: {str(e)}")
-        return ""
-
-def reorganize_markdown(raw: str) -> str:
-    """Reorganize markdown via OpenAI"""
-    client = OpenAI()
-    completion = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[
-            {"role": "user", "content": f"reorganize the following content:\n {raw}"},
-            {"role": "system", "content": (
-                "You are a reorganizer. Return the content in Markdown, keeping it identical. "
-                "Do not delete or replace anything—only reorganize for better structure. your response the content direct without (``` ```)."
-            )}
-        ]
-    )
-    print("===Reorganized Done===")
-    return completion.choices[0].message.content
-
-def rag(con: str, question: str) -> tuple[str, dict]:
-    """Answer questions from provided content and detect visualization requests"""
-    client = OpenAI()
-    
-    # Enhanced system prompt to detect visualization requests
-    system_prompt = f"""You are an assistant that answers questions from provided content. 
-    
-    If the user asks for charts, graphs, or visualizations:
-    1. First provide a text answer
-    2. Then provide data in JSON format for visualization
-    3. Use this format: [CHART_DATA]{{json_data}}[/CHART_DATA]
-    
-    For pie charts, use: {{"type": "pie", "labels": ["label1", "label2"], "values": [value1, value2], "title": "Chart Title"}}
-    For bar charts, use: {{"type": "bar", "x": ["item1", "item2"], "y": [value1, value2], "title": "Chart Title"}}
-    For line charts, use: {{"type": "line", "x": ["point1", "point2"], "y": [value1, value2], "title": "Chart Title"}}
-    
-    Answer from the following content:\n {con}"""
-    
-    completion = client.chat.completions.create(
-        model=LLM_MODEL,
-        messages=[
-            {"role": "user", "content": question},
-            {"role": "system", "content": system_prompt}
-        ]
-    )
-    
-    response = completion.choices[0].message.content
-    
-    # Extract chart data if present
-    chart_data = None
-    if "[CHART_DATA]" in response and "[/CHART_DATA]" in response:
-        try:
-            chart_start = response.find("[CHART_DATA]") + len("[CHART_DATA]")
-            chart_end = response.find("[/CHART_DATA]")
-            chart_json = response[chart_start:chart_end]
-            chart_data = json.loads(chart_json)
-            # Remove chart data from response text
-            response = response.replace(f"[CHART_DATA]{chart_json}[/CHART_DATA]", "").strip()
-        except:
-            chart_data = None
-    
-    return response, chart_data
-
-def create_visualization(chart_data: dict, unique_key: str = None):
-    """Create visualization based on chart data"""
-    if not chart_data:
-        return
-    
-    chart_type = chart_data.get("type", "").lower()
-    title = chart_data.get("title", "Chart")
-    
-    # Generate unique key if not provided
-    if unique_key is None:
-        unique_key = f"chart_{int(time.time() * 1000)}"
-    
-    if chart_type == "pie":
-        labels = chart_data.get("labels", [])
-        values = chart_data.get("values", [])
-        
-        if labels and values:
-            fig = px.pie(
-                values=values,
-                names=labels,
-                title=title,
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig.update_traces(textposition='inside', textinfo='percent+label')
-            fig.update_layout(
-                font=dict(size=12),
-                title_font_size=16,
-                showlegend=True
-            )
-            st.plotly_chart(fig, use_container_width=True, key=f"pie_{unique_key}")
-    
-    elif chart_type == "bar":
-        x_data = chart_data.get("x", [])
-        y_data = chart_data.get("y", [])
-        
-        if x_data and y_data:
-            fig = px.bar(
-                x=x_data,
-                y=y_data,
-                title=title,
-                color=y_data,
-                color_continuous_scale="viridis"
-            )
-            fig.update_layout(
-                xaxis_title="Categories",
-                yaxis_title="Values",
-                font=dict(size=12),
-                title_font_size=16
-            )
-            st.plotly_chart(fig, use_container_width=True, key=f"bar_{unique_key}")
-    
-    elif chart_type == "line":
-        x_data = chart_data.get("x", [])
-        y_data = chart_data.get("y", [])
-        
-        if x_data and y_data:
-            fig = px.line(
-                x=x_data,
-                y=y_data,
-                title=title,
-                markers=True
-            )
-            fig.update_layout(
-                xaxis_title="X-axis",
-                yaxis_title="Y-axis",
-                font=dict(size=12),
-                title_font_size=16
-            )
-            st.plotly_chart(fig, use_container_width=True, key=f"line_{unique_key}")
-
-def count_tokens(content: str, model="gpt-4-turbo"):
-    """Count tokens in the content"""
-    enc = tiktoken.encoding_for_model(model)
-    token_count = len(enc.encode(content))
-    print(f"The Size of the Content_Tokens: {token_count}")
-    return token_count
+@st.fragment(run_every=0.5)
+def job_progress(state_key: str, label: str, show_partial: bool = False):
+    """Poll a background job, rerunning the app once it has finished"""
+    job = get_job(st.session_state.get(state_key))
+    if job is None or not job.running:
+        st.rerun()
+    st.progress(job.fraction, text=f"{label} {job.message}")
+    if show_partial and st.session_state.stream_responses and job.partial:
+        with st.expander("✨ Reorganizing...", expanded=True):
+            st.markdown(job.partial)
 
-# ==== Main Process ====
+# ==== Q&A Fragments ====
+# Q&A (with its history) and Quick Actions rerun on their own, so asking a question does not
+# re-send the document views above them.
 
-if uploaded_file:
-    suffix = os.path.splitext(uploaded_file.name)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-        tmp_file.write(uploaded_file.getvalue())
-        file_path = tmp_file.name
+def trim_history():
+    """Archive Q&A entries beyond the ones kept in memory (the history only shows the latest)"""
+    history = st.session_state.qa_history
+    overflow = len(history) - SESSION_HISTORY_IN_MEMORY
+    if overflow > 0:
+        session_blobs().archive("qa_history", history[:overflow])
+        del history[:overflow]
+        st.session_state["qa_archived"] = st.session_state.get("qa_archived", 0) + overflow
 
-        # Processing Section
-        st.markdown("### 🔄 Processing Options")
+def save_to_history(question: str, answer: str, chart_data: dict):
+    st.session_state.questions_answered += 1
+    if "qa_history" not in st.session_state:
+        st.session_state.qa_history = []
+    
+    entry = {
+        "question": question,
+        "answer": answer,
+        "chart_data": chart_data,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    st.session_state.qa_history.append(entry)
+    trim_history()
+    store = document_store()
+    if store and "doc_id" in st.session_state:
+        store.add_qa(st.session_state["doc_id"], entry)
+
+@st.fragment
+def qa_section():
+    bind_request_session()
+    with span("rerun", backend="qa_fragment"):
+        st.markdown("""
+        <div class="question-section">
+            <h3>💬 Ask Questions About Your Content</h3>
+            <p>Get instant answers from your extracted content using AI</p>
+        </div>
+        """, unsafe_allow_html=True)
         
-        col1, col2 = st.columns(2)
+        # Question input
+        question = st.text_input(
+            "Ask anything about your content:",
+            placeholder="e.g., What are the main topics discussed in this document?",
+            help="Type your question and get AI-powered answers based on your content"
+        )
         
+        col1, col2 = st.columns([3, 1])
         with col1:
-            if st.button("🚀 Start Extraction", type="primary", use_container_width=True):
-                with st.spinner("🔍 Extracting content... This may take a moment"):
-                    progress_bar = st.progress(0)
+            if st.button("🎯 Get Answer", type="primary", use_container_width=True):
+                if question:
+                    content_to_use = document_text()
                     
-                    # Simulate progress
-                    for i in range(100):
-                        time.sleep(0.01)
-                        progress_bar.progress(i + 1)
+                    # Display Q&A
+                    st.markdown("### 💡 AI Response")
                     
-                    raw_text = convert_file(file_path)
-                    st.session_state["raw_text"] = raw_text
-                    st.session_state.files_processed += 1
+                    with st.expander("📝 Your Question", expanded=True):
+                        st.markdown(f"**Q:** {question}")
                     
-                    # Success message
-                    st.markdown("""
-                    <div class="success-message">
-                        ✅ <strong>Content extracted successfully!</strong><br>
-                        Your document has been processed and is ready for use.
-                    </div>
-                    """, unsafe_allow_html=True)
+                    with st.expander("🤖 AI Answer", expanded=True):
+                        answer, chart_data = answer_question(question, content_to_use, "🤔 Analyzing your question...")
+                        
+                        # Create visualization if chart data is present
+                        if chart_data:
+                            st.markdown("### 📊 Visual Representation")
+                            create_visualization(chart_data, f"main_{chart_hash(chart_data)}")
                     
-                    # Token count
-                    if raw_text:
-                        token_count = count_tokens(raw_text)
-                        st.info(f"📊 **Content Statistics:** {len(raw_text):,} characters, ~{token_count:,} tokens")
-
+                    save_to_history(question, answer, chart_data)
+                else:
+                    st.warning("⚠️ Please enter a question first!")
+        
         with col2:
-            if "raw_text" in st.session_state:
-                if st.button("🧹 Reorganize Content", type="secondary", use_container_width=True):
-                    with st.spinner("🔄 Reorganizing content for better structure..."):
-                        progress_bar = st.progress(0)
-                        
-                        for i in range(100):
-                            time.sleep(0.01)
-                            progress_bar.progress(i + 1)
-                        
-                        organized = reorganize_markdown(st.session_state["raw_text"])
-                        st.session_state["organized_text"] = organized
-                        
-                        st.markdown("""
-                        <div class="success-message">
-                            ✅ <strong>Content reorganized successfully!</strong><br>
-                            Your content has been restructured for better readability.
-                        </div>
-                        """, unsafe_allow_html=True)
-
-        # Display extracted content
-        if "raw_text" in st.session_state:
-            st.markdown("### 📄 Extracted Content")
-            
-            # Tabs for different views
-            tab1, tab2 = st.tabs(["📖 Raw Content", "✨ Organized Content"])
-            
-            with tab1:
-                st.text_area(
-                    "Raw extracted content:",
-                    st.session_state["raw_text"],
-                    height=300,
-                    help="This is the raw content extracted from your document"
-                )
+            if st.button("🗑️ Clear", use_container_width=True):
+                st.session_state.qa_history = []
+                st.session_state["qa_archived"] = 0
+                session_blobs().discard("qa_history")
+                st.session_state.pop("rag_session", None)
+                store = document_store()
+                if store and "doc_id" in st.session_state:
+                    store.clear_qa(st.session_state["doc_id"])
+                st.rerun(scope="fragment")
+
+        # Q&A History
+        if "qa_history" in st.session_state and st.session_state.qa_history:
+            st.markdown("### 📚 Question History")
             
-            with tab2:
-                if "organized_text" in st.session_state:
-                    st.markdown(st.session_state["organized_text"])
+            for i, qa in enumerate(reversed(st.session_state.qa_history[-5:])):  # Show last 5 Q&As
+                number = st.session_state.get("qa_archived", 0) + len(st.session_state.qa_history) - i
+                with st.expander(f"Q{number}: {qa['question'][:50]}...", expanded=False):
+                    st.markdown(f"**Question:** {qa['question']}")
+                    st.markdown(f"**Answer:** {qa['answer']}")
                     
-                    # Download button
-                    st.download_button(
-                        label="⬇️ Download Organized Content",
-                        data=st.session_state["organized_text"],
-                        file_name=f"organized_content_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                        mime="text/plain",
-                        use_container_width=True
-                    )
-                else:
-                    st.info("👆 Click 'Reorganize Content' to see the structured version")
+                    # Show visualization if available
+                    if qa.get('chart_data'):
+                        st.markdown("**📊 Visualization:**")
+                        create_visualization(qa['chart_data'], f"history_{number}_{chart_hash(qa['chart_data'])}")
+                    
+                    st.caption(f"⏰ {qa['timestamp']}")
 
-        # Q&A Section
-        if "raw_text" in st.session_state:
-            st.markdown("""
-            <div class="question-section">
-                <h3>💬 Ask Questions About Your Content</h3>
-                <p>Get instant answers from your extracted content using AI</p>
-            </div>
-            """, unsafe_allow_html=True)
+QUICK_QUESTIONS = {
+    "📊 Create Summary Chart": "Create a pie chart showing the main topics or categories in this content",
+    "📈 Show Data Trends": "Create a bar chart showing any numerical data or statistics from this content",
+    "🔍 Key Insights": "What are the key insights and main points from this content?",
+}
+
+def start_prefetch():
+    """Answer the Quick Actions in the background for the current document"""
+    content = document_text()
+    if not st.session_state.prefetch_quick_actions or not content:
+        return
+    st.session_state["prefetch_job"] = submit_job(
+        "prefetch", prefetch_job, content, list(QUICK_QUESTIONS.values()), st.session_state["content_hash"],
+        session_blobs().get("doc_index"), session_blobs().get("doc_tables")).id
+
+def wait_for_prefetch(question: str):
+    """Block until a running prefetch has answered question (or finished without it)"""
+    prefetch = get_job(st.session_state.get("prefetch_job"))
+    doc_hash = st.session_state["content_hash"]
+    if prefetch and prefetch.running and not get_answer_cache().contains(doc_hash, question):
+        with st.spinner("⏳ Finishing the prefetched answer..."):
+            while prefetch.running and not get_answer_cache().contains(doc_hash, question):
+                time.sleep(0.1)
+
+@st.fragment
+def quick_actions_section():
+    bind_request_session()
+    with span("rerun", backend="quick_actions_fragment"):
+        st.markdown("### ⚡ Quick Actions")
+        st.markdown("Try these common questions:")
+        
+        question = None
+        for col, (label, quick_question) in zip(st.columns(3), QUICK_QUESTIONS.items()):
+            with col:
+                if st.button(label, use_container_width=True):
+                    question = quick_question
+        
+        # Handle quick questions
+        if question:
+            wait_for_prefetch(question)
+            content_to_use = document_text()
             
-            # Question input
-            question = st.text_input(
-                "Ask anything about your content:",
-                placeholder="e.g., What are the main topics discussed in this document?",
-                help="Type your question and get AI-powered answers based on your content"
-            )
+            st.markdown("### 💡 Quick Answer")
+            st.markdown(f"**Q:** {question}")
+            answer, chart_data = answer_question(question, content_to_use, "🤔 Processing your quick question...")
             
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                if st.button("🎯 Get Answer", type="primary", use_container_width=True):
-                    if question:
-                        with st.spinner("🤔 Analyzing your question..."):
-                            progress_bar = st.progress(0)
-                            
-                            for i in range(100):
-                                time.sleep(0.01)
-                                progress_bar.progress(i + 1)
-                            
-                            content_to_use = st.session_state.get("organized_text", st.session_state["raw_text"])
-                            answer, chart_data = rag(content_to_use, question)
-                            st.session_state.questions_answered += 1
-                            
-                            # Display Q&A
-                            st.markdown("### 💡 AI Response")
-                            
-                            with st.expander("📝 Your Question", expanded=True):
-                                st.markdown(f"**Q:** {question}")
-                            
-                            with st.expander("🤖 AI Answer", expanded=True):
-                                st.markdown(f"**A:** {answer}")
-                                
-                                # Create visualization if chart data is present
-                                if chart_data:
-                                    st.markdown("### 📊 Visual Representation")
-                                    create_visualization(chart_data, f"main_{int(time.time() * 1000)}")
-                                
-                            # Save to session state for history
-                            if "qa_history" not in st.session_state:
-                                st.session_state.qa_history = []
-                            
-                            st.session_state.qa_history.append({
-                                "question": question,
-                                "answer": answer,
-                                "chart_data": chart_data,
-                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            })
-                    else:
-                        st.warning("⚠️ Please enter a question first!")
+            if chart_data:
+                st.markdown("### 📊 Visual Representation")
+                create_visualization(chart_data, f"quick_{chart_hash(chart_data)}")
             
-            with col2:
-                if st.button("🗑️ Clear", use_container_width=True):
-                    st.session_state.qa_history = []
-                    st.rerun()
+            save_to_history(question, answer, chart_data)
 
-            # Q&A History
-            if "qa_history" in st.session_state and st.session_state.qa_history:
-                st.markdown("### 📚 Question History")
-                
-                for i, qa in enumerate(reversed(st.session_state.qa_history[-5:])):  # Show last 5 Q&As
-                    with st.expander(f"Q{len(st.session_state.qa_history)-i}: {qa['question'][:50]}...", expanded=False):
-                        st.markdown(f"**Question:** {qa['question']}")
-                        st.markdown(f"**Answer:** {qa['answer']}")
-                        
-                        # Show visualization if available
-                        if qa.get('chart_data'):
-                            st.markdown("**📊 Visualization:**")
-                            create_visualization(qa['chart_data'], f"history_{i}_{int(time.time() * 1000)}")
-                        
-                        st.caption(f"⏰ {qa['timestamp']}")
+# ==== Document Viewer ====
 
-        # Quick Actions Section
-        if "raw_text" in st.session_state:
-            st.markdown("### ⚡ Quick Actions")
-            st.markdown("Try these common questions:")
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                if st.button("📊 Create Summary Chart", use_container_width=True):
-                    st.session_state.quick_question = "Create a pie chart showing the main topics or categories in this content"
-                    st.rerun()
+def _jump_to(key: str, widget: str, index: dict):
+    """on_change callback: move the viewer to the page of the selected heading or search hit"""
+    selected = st.session_state[f"{key}_{widget}"]
+    if selected:
+        offset = selected["offset"] if widget == "hit" else selected[2]
+        st.session_state[f"{key}_page"] = page_of(index, offset) + 1
+
+@st.fragment
+def document_viewer(key: str, label: str, markdown: bool = False):
+    """Page through session_blobs()[key], sending only the visible page to the browser"""
+    text = session_blobs()[key]
+    index = get_page_index(text)
+    pages = len(index["pages"])
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = 1
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        headings = [h for h in index["headings"] if h[0] <= 3]
+        if headings:
+            st.selectbox("Jump to section", headings, index=None, key=f"{key}_heading",
+                         format_func=lambda h: f"{'  ' * (h[0] - 1)}{h[1][:80]}",
+                         placeholder="Choose a heading...", on_change=_jump_to, args=(key, "heading", index))
+    with col2:
+        query = st.text_input("Search in document", key=f"{key}_search", placeholder="Find text...")
+    
+    if query:
+        hits = search_document(text, index, query)
+        if hits:
+            st.selectbox(f"{len(hits)}{'+' if len(hits) == 50 else ''} matches", hits, index=None, key=f"{key}_hit",
+                         format_func=lambda h: f"p.{h['page'] + 1}: {h['snippet']}",
+                         placeholder="Go to match...", on_change=_jump_to, args=(key, "hit", index))
+        else:
+            st.caption("No matches")
+    
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key=f"{key}_page") \
+        if pages > 1 else 1
+    visible = page_text(text, index, page - 1)
+    if markdown:
+        st.markdown(visible)
+    else:
+        st.text_area(f"{label}:", visible, height=300, help="This is the raw content extracted from your document")
+    st.caption(f"Showing characters {index['pages'][page - 1][0]:,}–{index['pages'][page - 1][1]:,} of {len(text):,}")
+
+# ==== Main Process ====
+
+if uploaded_file or "raw_text" in session_blobs():
+    # Processing Section
+    st.markdown("### 🔄 Processing Options")
+    if not uploaded_file:
+        st.caption(f"📚 Opened from the document library: {st.session_state.get('doc_name', 'stored document')}")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # A second submit would orphan the running job, which keeps spending API calls
+        extracting = job_running("extraction_job")
+        if uploaded_file and st.button("🚀 Start Extraction", type="primary", use_container_width=True,
+                                       disabled=extracting) and not extracting:
+            st.session_state["extraction_job"] = submit_job(
+                "extraction", extraction_job, uploaded_file, os.path.splitext(uploaded_file.name)[1]).id
+            st.session_state["doc_name"] = uploaded_file.name
+        
+        extraction_done = finished_job("extraction_job")
+        if extraction_done:
+            extraction = extraction_done.result or {}
+            raw_text = extraction.get("text", "")
+            if extraction_done.error or extraction.get("error"):
+                st.error(extraction_done.error or extraction["error"])
+            docs = session_blobs()
+            docs["raw_text"] = raw_text
+            docs.discard("organized_text")
+            docs["doc_index"] = extraction.get("index")
+            docs["doc_tables"] = extraction.get("tables")
+            docs["compaction"] = extraction.get("compaction")   # maps raw_text back to the extracted text
+            st.session_state["content_hash"] = extraction.get("content_hash") or content_hash(raw_text)
+            st.session_state.files_processed += 1
+            st.session_state.pop("doc_id", None)   # Q&A of this upload must not land on a previous document
+            store = document_store()
+            if store and raw_text:
+                st.session_state["doc_id"] = document_id(library_owner(), extraction["file_hash"])
+                store.save_document(library_owner(), st.session_state["doc_id"],
+                                    st.session_state.get("doc_name", "document"), raw_text, extraction.get("index"),
+                                    extraction.get("extractor"), extraction.get("tokens"))
             
-            with col2:
-                if st.button("📈 Show Data Trends", use_container_width=True):
-                    st.session_state.quick_question = "Create a bar chart showing any numerical data or statistics from this content"
-                    st.rerun()
+            # Success message
+            st.markdown("""
+            <div class="success-message">
+                ✅ <strong>Content extracted successfully!</strong><br>
+                Your document has been processed and is ready for use.
+            </div>
+            """, unsafe_allow_html=True)
             
-            with col3:
-                if st.button("🔍 Key Insights", use_container_width=True):
-                    st.session_state.quick_question = "What are the key insights and main points from this content?"
-                    st.rerun()
+            # Token count
+            if raw_text:
+                token_count = extraction["tokens"]
+                st.info(f"📊 **Content Statistics:** {len(raw_text):,} characters, ~{token_count:,} tokens")
+                if extraction["cache_hit"]:
+                    st.caption("⚡ Loaded from extraction cache")
+                compaction = extraction.get("compaction")
+                if compaction and compaction["tokens_saved"] > 0:
+                    st.caption(f"✂️ Compaction removed {compaction['tokens_saved']:,} tokens "
+                               f"({compaction['tokens_saved'] / compaction['original_tokens']:.0%}) of page headers, "
+                               "footers, padding and repeated blocks")
+                start_prefetch()
+        elif "extraction_job" in st.session_state:
+            job_progress("extraction_job", "🔍 Extracting content...")
+
+    with col2:
+        if "raw_text" in session_blobs():
+            reorganizing = job_running("reorganize_job")
+            if st.button("🧹 Reorganize Content", type="secondary", use_container_width=True,
+                         disabled=reorganizing) and not reorganizing:
+                st.session_state["reorganize_job"] = submit_job(
+                    "reorganize", reorganize_job, session_blobs()["raw_text"]).id
             
-            # Handle quick questions
-            if "quick_question" in st.session_state:
-                question = st.session_state.quick_question
-                del st.session_state.quick_question
+            reorganize_done = finished_job("reorganize_job")
+            if reorganize_done and reorganize_done.error:
+                st.error(f"Reorganization failed: {reorganize_done.error}")
+            elif reorganize_done:
+                docs = session_blobs()
+                docs["organized_text"] = reorganize_done.result["text"]
+                docs["doc_index"] = reorganize_done.result["index"]
+                docs["doc_tables"] = reorganize_done.result["tables"]
+                st.session_state["content_hash"] = reorganize_done.result["content_hash"]
+                store = document_store()
+                if store and "doc_id" in st.session_state:
+                    store.save_organized(st.session_state["doc_id"], reorganize_done.result["text"],
+                                         reorganize_done.result["index"])
+                start_prefetch()
                 
-                with st.spinner("🤔 Processing your quick question..."):
-                    content_to_use = st.session_state.get("organized_text", st.session_state["raw_text"])
-                    answer, chart_data = rag(content_to_use, question)
-                    st.session_state.questions_answered += 1
-                    
-                    st.markdown("### 💡 Quick Answer")
-                    st.markdown(f"**Q:** {question}")
-                    st.markdown(f"**A:** {answer}")
-                    
-                    if chart_data:
-                        st.markdown("### 📊 Visual Representation")
-                        create_visualization(chart_data, f"quick_{int(time.time() * 1000)}")
-                    
-                    # Save to history
-                    if "qa_history" not in st.session_state:
-                        st.session_state.qa_history = []
-                    
-                    st.session_state.qa_history.append({
-                        "question": question,
-                        "answer": answer,
-                        "chart_data": chart_data,
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
+                st.markdown("""
+                <div class="success-message">
+                    ✅ <strong>Content reorganized successfully!</strong><br>
+                    Your content has been restructured for better readability.
+                </div>
+                """, unsafe_allow_html=True)
+            elif "reorganize_job" in st.session_state:
+                job_progress("reorganize_job", "🔄 Reorganizing content...", show_partial=True)
+
+    # Display extracted content
+    if "raw_text" in session_blobs():
+        st.markdown("### 📄 Extracted Content")
+        
+        # Tabs for different views
+        tab1, tab2 = st.tabs(["📖 Raw Content", "✨ Organized Content"])
+        
+        with tab1:
+            document_viewer("raw_text", "Raw extracted content")
+        
+        with tab2:
+            if "organized_text" in session_blobs():
+                document_viewer("organized_text", "Organized content", markdown=True)
+                
+                # Download button
+                st.download_button(
+                    label="⬇️ Download Organized Content",
+                    data=lambda docs=session_blobs(): docs["organized_text"],
+                    file_name=f"organized_content_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+            else:
+                st.info("👆 Click 'Reorganize Content' to see the structured version")
+
+    # Q&A Section
+    if "raw_text" in session_blobs():
+        qa_section()
+    
+    # Quick Actions Section
+    if "raw_text" in session_blobs():
+        quick_actions_section()
+
+# ==== Cross-Document Questions ====
+@st.fragment
+def library_qa_section(documents: list[dict]):
+    bind_request_session()
+    st.markdown("### 📚 Ask Across Documents")
+    names = {doc["id"]: doc["name"] for doc in documents}
+    doc_ids = st.multiselect("Documents to search:", list(names), default=list(names)[:2], format_func=names.get)
+    question = st.text_input("Question across the selected documents:",
+                             placeholder="e.g., How do the conclusions of these reports differ?")
+    if st.button("🔎 Search Library", use_container_width=True):
+        if not doc_ids or not question:
+            st.warning("⚠️ Select documents and enter a question first!")
+            return
+        with st.spinner("🤔 Searching the selected documents..."):
+            answer, chart_data = rag_documents(question, library_owner(), doc_ids)
+        st.markdown(answer)
+        if chart_data:
+            create_visualization(chart_data, f"library_{chart_hash(chart_data)}")
+
+if len(stored_documents) > 1:
+    library_qa_section(stored_documents)
+
+# ==== Profiling Panel ====
+if st.session_state.show_profiling:
+    with st.expander("⏱️ Pipeline Profiling", expanded=True):
+        usage = get_session_store().usage()
+        st.caption(f"🗄️ Session state: {usage['resident_bytes'] / 1e6:.1f} MB in memory "
+                   f"(budget {usage['memory_budget'] / 1e6:.0f} MB), {usage['disk_bytes'] / 1e6:.1f} MB on disk "
+                   f"across {usage['sessions']} sessions, {usage['loads']} reloads")
+        summary = stage_summary()
+        if summary:
+            st.markdown("**Per-stage latency (recent spans, all sessions)**")
+            st.dataframe(summary, use_container_width=True, hide_index=True)
+            st.markdown("**Recent spans**")
+            st.dataframe([
+                {key: span.get(key) for key in ("stage", "backend", "duration", "input_bytes", "prompt_tokens",
+                                                 "cached_tokens", "completion_tokens", "bytes_saved", "status")}
+                for span in list(SPANS)[-20:][::-1]
+            ], use_container_width=True, hide_index=True)
+            st.download_button("⬇️ Prometheus metrics", data=render_prometheus(),
+                               file_name="metrics.prom", mime="text/plain")
+        else:
+            st.info("No pipeline stages have run yet.")
 
 # ==== Footer ====
 st.markdown("---")
@@ -641,3 +827,5 @@ st.markdown("""
     <p><small>© 2024 Ahmed Zeyad Tareq - All rights reserved</small></p>
 </div>
 """, unsafe_allow_html=True)
+
+record_span("rerun", backend="app", duration=time.perf_counter() - _rerun_started)
@@ -0,0 +1,143 @@
+"""Synthetic benchmark corpus: PDFs (digital and mixed scanned), DOCX and images in several sizes.
+
+Files are generated deterministically without extra dependencies (Pillow is only needed for
+images), so benchmark runs are comparable across machines and commits.
+"""
+import os
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+SIZES = {"small": 2, "medium": 20, "large": 100}   # pages (PDF) / sections (DOCX)
+
+WORDS = ("revenue growth quarter margin customer product market region forecast budget cost "
+         "operations strategy team delivery risk compliance analysis report target investment "
+         "performance pipeline supplier contract pricing demand capacity service quality").split()
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    if rng.random() < 0.3:
+        words.insert(rng.randint(0, len(words)), f"{rng.randint(1, 999)}.{rng.randint(0, 9)}%")
+    return " ".join(words).capitalize() + "."
+
+def _page_lines(rng: random.Random, page: int) -> list[str]:
+    lines = [f"Section {page}: {rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"]
+    lines += [_sentence(rng) for _ in range(30)]
+    return lines
+
+# ==== PDF ====
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, pages: int, scanned_every: int = 0, seed: int = 0):
+    """Write a text PDF; every scanned_every-th page has no text layer (like a scanned page)"""
+    rng = random.Random(seed)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+                   " ".join(f"{3 + 2 * i} 0 R" for i in range(pages)), pages)]
+    font_id = 3 + 2 * pages
+    for page in range(pages):
+        scanned = scanned_every and (page + 1) % scanned_every == 0
+        if scanned:
+            content = "0.5 g 72 72 468 648 re f"   # a grey block, no text
+        else:
+            text = " T* ".join(f"({_pdf_escape(line[:95])}) Tj" for line in _page_lines(rng, page + 1))
+            content = f"BT /F1 10 Tf 12 TL 50 760 Td {text} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * page} 0 R >>")
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+# ==== DOCX ====
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+def _docx_paragraph(text: str, style: str = None) -> str:
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{props}<w:r><w:t>{escape(text)}</w:t></w:r></w:p>"
+
+def _docx_table(rows: list[list[str]]) -> str:
+    cells = "".join("<w:tr>" + "".join(f"<w:tc>{_docx_paragraph(cell)}</w:tc>" for cell in row) + "</w:tr>"
+                    for row in rows)
+    return f"<w:tbl>{cells}</w:tbl>"
+
+def write_docx(path: str, sections: int, seed: int = 0):
+    """Write a DOCX with headings, paragraphs and a numeric table per section"""
+    rng = random.Random(seed)
+    body = []
+    for section in range(1, sections + 1):
+        lines = _page_lines(rng, section)
+        body.append(_docx_paragraph(lines[0], "Heading1"))
+        body += [_docx_paragraph(" ".join(lines[i:i + 5])) for i in range(1, len(lines), 5)]
+        body.append(_docx_table([["Quarter", "Revenue", "Cost"]] +
+                                [[f"Q{q}", str(rng.randint(100, 999)), str(rng.randint(50, 500))] for q in range(1, 5)]))
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f'<w:body>{"".join(body)}</w:body></w:document>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        docx.writestr("_rels/.rels", _RELS)
+        docx.writestr("word/document.xml", document)
+
+# ==== Images ====
+
+IMAGE_SIZES = {"small": (800, 600), "medium": (2000, 1500), "large": (4000, 3000)}
+
+def write_image(path: str, size: tuple[int, int], seed: int = 0):
+    """Write a noisy 'photo of a page' so OCR pre-processing has realistic work to do"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.effect_noise(size, 40).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    y = 40
+    while y < size[1] - 40:
+        draw.text((40, y), _sentence(rng), fill=(20, 20, 20))
+        y += 24
+    image.save(path, quality=92)
+
+def build_corpus(directory: str, sizes: list[str] = None) -> list[str]:
+    """Generate the corpus into directory (reusing existing files) and return the file paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name in sizes or list(SIZES):
+        pages = SIZES[name]
+        targets = {
+            f"report_{name}.pdf": lambda p: write_pdf(p, pages, seed=pages),
+            f"scanned_mix_{name}.pdf": lambda p: write_pdf(p, pages, scanned_every=4, seed=pages + 1),
+            f"report_{name}.docx": lambda p: write_docx(p, pages, seed=pages + 2),
+            f"photo_{name}.jpg": lambda p: write_image(p, IMAGE_SIZES[name], seed=pages + 3),
+        }
+        for filename, write in targets.items():
+            path = os.path.join(directory, filename)
+            if not os.path.exists(path):
+                try:
+                    write(path)
+                except ImportError as e:
+                    print(f"[⚠️] Skipping {filename}: {e}")
+                    continue
+            paths.append(path)
+    return paths
@@ -0,0 +1,146 @@
+"""Per-interaction server time and payload size of the Streamlit app.
+
+Drives app.py headlessly with Streamlit's AppTest against the local API stand-in: uploads a
+synthetic document, extracts it, seeds a Q&A history with charts, then times typical
+interactions and sums the bytes of the ForwardMsgs each one sends to the browser.
+
+    python -m benchmarks.rerun                       # measure app.py
+    python -m benchmarks.rerun --app old_app.py     # e.g. compare against a previous version
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.corpus import _sentence
+
+HISTORY_CHARTS = [
+    {"type": "pie", "labels": ["Revenue", "Cost", "Margin"], "values": [50, 30, 20], "title": "Split"},
+    {"type": "bar", "x": ["Q1", "Q2", "Q3", "Q4"], "y": [12, 18, 15, 22], "title": "Quarterly values"},
+    {"type": "line", "x": [1, 2, 3, 4, 5], "y": [3, 5, 4, 6, 8], "title": "Trend"},
+]
+
+def _document(paragraphs: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    sections = [f"## Section {i + 1}\n\n" + " ".join(_sentence(rng) for _ in range(6)) for i in range(paragraphs)]
+    return ("# Benchmark Report\n\n" + "\n\n".join(sections)).encode("utf-8")
+
+class _PayloadMeter:
+    """Sums ForwardMsg sizes per run and scopes reruns to a widget's fragment like the browser does.
+
+    AppTest always reruns the whole script, while the real frontend sends the fragment id of
+    the widget that changed; the meter remembers which fragment rendered each widget label and
+    adds it to the next rerun request.
+    """
+
+    def __init__(self):
+        from dataclasses import replace
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+        from streamlit.testing.v1 import local_script_runner
+
+        self.bytes = 0
+        self.messages = 0
+        self.fragments = {}        # widget label -> fragment id that rendered it
+        self.scope = None
+        meter = self
+        original_enqueue = ForwardMsgQueue.enqueue
+        rerun_data = local_script_runner.RerunData
+
+        def enqueue(queue, msg):
+            meter.bytes += msg.ByteSize()
+            meter.messages += 1
+            if msg.HasField("delta") and msg.delta.HasField("new_element"):
+                element = msg.delta.new_element
+                widget = getattr(element, element.WhichOneof("type") or "", None)
+                if getattr(widget, "label", None):
+                    meter.fragments[widget.label] = msg.delta.fragment_id
+            return original_enqueue(queue, msg)
+
+        def scoped_rerun_data(**kwargs):
+            data = rerun_data(**kwargs)
+            return replace(data, fragment_id_queue=[meter.scope]) if meter.scope else data
+
+        ForwardMsgQueue.enqueue = enqueue
+        local_script_runner.RerunData = scoped_rerun_data
+
+    def reset(self):
+        self.bytes = self.messages = 0
+
+def _measure(meter: _PayloadMeter, at, name: str, label: str, interact) -> dict:
+    tree = at._tree
+    meter.reset()
+    meter.scope = meter.fragments.get(label)
+    started = time.perf_counter()
+    try:
+        interact()
+    finally:
+        scoped, meter.scope = meter.scope, None
+    seconds = time.perf_counter() - started
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].value}")
+    payload_bytes, messages = meter.bytes, meter.messages
+    if scoped:
+        # AppTest's tree only holds the fragment's elements after a scoped run (and it derives
+        # widget state from the tree), so rebuild the full tree with an unmeasured app run
+        at._tree = tree
+        at.run()
+    return {"interaction": name, "fragment": bool(scoped), "seconds": seconds,
+            "payload_bytes": payload_bytes, "messages": messages}
+
+def run(app_path: str, paragraphs: int, repeats: int) -> list[dict]:
+    from streamlit.testing.v1 import AppTest
+
+    meter = _PayloadMeter()
+    at = AppTest.from_file(os.path.abspath(app_path), default_timeout=120)
+    at.run()
+    at.file_uploader[0].upload("report.md", _document(paragraphs), "text/markdown").run()
+    next(b for b in at.button if "Start Extraction" in b.label).click().run()
+    deadline = time.time() + 60
+    while "content_hash" not in at.session_state and time.time() < deadline:
+        time.sleep(0.2)
+        at.run()
+    if "content_hash" not in at.session_state:
+        raise RuntimeError("extraction did not finish")
+
+    at.session_state["qa_history"] = [
+        {"question": f"Chart question {i}", "answer": "Answer", "chart_data": HISTORY_CHARTS[i % 3],
+         "timestamp": "2024-01-01 00:00:00"} for i in range(5)]
+    at.run()
+
+    results = []
+    button = lambda label: next(b for b in at.button if b.label == label)
+    for i in range(repeats):
+        question = at.text_input[0]
+        results.append(_measure(meter, at, "type question", question.label,
+                                lambda: question.input(f"What is the revenue trend {i}?").run()))
+        results.append(_measure(meter, at, "ask question", "🎯 Get Answer",
+                                lambda: button("🎯 Get Answer").click().run()))
+        results.append(_measure(meter, at, "quick action", "🔍 Key Insights",
+                                lambda: button("🔍 Key Insights").click().run()))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--paragraphs", type=int, default=400, help="sections in the uploaded document")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    from benchmarks.stub_server import StubConfig, start_stub_server
+    server = start_stub_server(StubConfig(ttft=0.05, tokens_per_second=2000.0))
+    url = f"http://127.0.0.1:{server.server_port}"
+    os.environ.update({"OPENAI_BASE_URL": f"{url}/v1", "OPENAI_API_KEY": "bench",
+                       "EXTRACTION_CACHE_DIR": tempfile.mkdtemp(prefix="bench_cache_")})
+
+    results = run(args.app, args.paragraphs, args.repeats)
+    print(f"{'interaction':<16}{'scope':>10}{'server s':>10}{'payload KB':>12}{'messages':>10}")
+    for name in dict.fromkeys(r["interaction"] for r in results):
+        rows = [r for r in results if r["interaction"] == name]
+        print(f"{name:<16}{'fragment' if rows[0]['fragment'] else 'app':>10}"
+              f"{sum(r['seconds'] for r in rows) / len(rows):>10.3f}"
+              f"{sum(r['payload_bytes'] for r in rows) / len(rows) / 1024:>12.1f}"
+              f"{sum(r['messages'] for r in rows) / len(rows):>10.0f}")
+
+if __name__ == "__main__":
+    main()
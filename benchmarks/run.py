@@ -0,0 +1,164 @@
+"""Offline benchmark for convert_file / reorganize_markdown / rag throughput.
+
+Runs the real pipeline against the local API stand-in (benchmarks/stub_server.py) over a
+synthetic corpus, for several numbers of concurrent sessions. Each concurrency level runs in
+its own worker process so peak RSS is measured per scenario.
+
+    python -m benchmarks.run                          # 1, 10 and 100 sessions
+    python -m benchmarks.run --sessions 1 10 --reorganize --json results.json
+    python -m benchmarks.run --baseline results.json  # exit 1 on a p95/throughput regression
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "Create a pie chart showing the main topics or categories in this content",
+    "Create a bar chart showing any numerical data or statistics from this content",
+    "What are the key insights and main points from this content?",
+]
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))] if values else 0.0
+
+def _summarize(durations: list[float]) -> dict:
+    return {"count": len(durations), "p50": _percentile(durations, 0.50),
+            "p95": _percentile(durations, 0.95), "p99": _percentile(durations, 0.99)}
+
+# ==== Worker ====
+
+def run_worker(sessions: int, corpus: list[str], questions: int, reorganize: bool) -> dict:
+    """Run `sessions` concurrent user sessions in this process and report stage latencies"""
+    import resource
+    from core import extract_document, build_index, rag, plan_reorganize, reorganize_markdown, \
+        reorganize_markdown_parallel
+    from core.telemetry import SPANS
+
+    def session(i: int) -> dict:
+        path = corpus[i % len(corpus)]
+        started = time.perf_counter()
+        extraction = extract_document(path, use_cache=False)
+        text = extraction["text"]
+        if text and reorganize:
+            if plan_reorganize(text)["strategy"] == "map_reduce":
+                text = reorganize_markdown_parallel(text)
+            else:
+                text = reorganize_markdown(text)
+        index = build_index(text) if text else None
+        for question in QUESTIONS[:questions]:
+            if text:
+                rag(text, question, index=index)
+        return {"file": os.path.basename(path), "seconds": time.perf_counter() - started,
+                "error": extraction["error"]}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        results = list(executor.map(session, range(sessions)))
+    wall = time.perf_counter() - started
+
+    stages = {}
+    for span in list(SPANS):
+        stages.setdefault(f"{span['stage']}/{span['backend']}", []).append(span["duration"])
+    return {
+        "sessions": sessions,
+        "wall_seconds": wall,
+        "sessions_per_second": sessions / wall if wall else 0.0,
+        "session": _summarize([r["seconds"] for r in results]),
+        "stages": {name: _summarize(durations) for name, durations in sorted(stages.items())},
+        "errors": sum(1 for r in results if r["error"]),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+# ==== Orchestrator ====
+
+def _print_scenario(result: dict):
+    print(f"\n=== {result['sessions']} concurrent session(s) ===")
+    print(f"wall {result['wall_seconds']:.2f}s | {result['sessions_per_second']:.2f} sessions/s | "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB | errors {result['errors']}")
+    print(f"{'stage':<28}{'count':>7}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}")
+    for name, stats in [("session (end-to-end)", result["session"])] + list(result["stages"].items()):
+        print(f"{name:<28}{stats['count']:>7}{stats['p50']:>9.3f}{stats['p95']:>9.3f}{stats['p99']:>9.3f}")
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Regressions against a previous --json run: slower p95 or lower throughput beyond tolerance"""
+    previous = {r["sessions"]: r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["sessions"])
+        if not before:
+            continue
+        if result["sessions_per_second"] < before["sessions_per_second"] * (1 - tolerance):
+            regressions.append(f"{result['sessions']} sessions: throughput {before['sessions_per_second']:.2f} "
+                               f"-> {result['sessions_per_second']:.2f} sessions/s")
+        for name, stats in result["stages"].items():
+            old = before["stages"].get(name)
+            if old and stats["p95"] > old["p95"] * (1 + tolerance):
+                regressions.append(f"{result['sessions']} sessions: {name} p95 {old['p95']:.3f}s -> {stats['p95']:.3f}s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=["small", "medium", "large"])
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "extraction_bench_corpus"))
+    parser.add_argument("--questions", type=int, default=3, help="RAG questions per session")
+    parser.add_argument("--reorganize", action="store_true", help="also reorganize each document")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tps", type=float, default=400.0)
+    parser.add_argument("--ocr-page-latency", type=float, default=0.5)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="previous --json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    from benchmarks.corpus import build_corpus
+    corpus = build_corpus(args.corpus_dir, args.sizes)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.sessions[0], corpus, args.questions, args.reorganize)))
+        return
+
+    from benchmarks.stub_server import StubConfig, start_stub_server
+    server = start_stub_server(StubConfig(ttft=args.ttft, tokens_per_second=args.tps,
+                                          ocr_page_latency=args.ocr_page_latency))
+    url = f"http://127.0.0.1:{server.server_port}"
+    env = {**os.environ,
+           "OPENAI_BASE_URL": f"{url}/v1", "OPENAI_API_KEY": "bench",
+           "LLAMA_CLOUD_BASE_URL": url, "LLAMA_API_PARSE": "llx-bench",
+           "EXTRACTION_CACHE_DIR": tempfile.mkdtemp(prefix="bench_cache_")}
+    print(f"Stub API on {url}; corpus: {len(corpus)} files in {args.corpus_dir}")
+
+    results = []
+    for sessions in args.sessions:
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", "--sessions", str(sessions),
+                   "--sizes", *args.sizes, "--corpus-dir", args.corpus_dir, "--questions", str(args.questions)]
+        if args.reorganize:
+            command.append("--reorganize")
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(completed.stderr)
+            sys.exit(f"Scenario with {sessions} sessions failed")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        _print_scenario(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Local stand-in for the OpenAI and LlamaParse HTTP APIs used by the benchmarks.
+
+Implements just enough of each API for the real SDKs to talk to it:
+
+* OpenAI: POST /v1/chat/completions (blocking and SSE streaming) and POST /v1/embeddings
+* LlamaParse: POST /api/parsing/upload, GET /api/parsing/job/{id}, GET /api/parsing/job/{id}/result/markdown
+
+Latency is simulated: a fixed time-to-first-token plus completion tokens / token rate for
+chat, and a per-page delay for OCR jobs. Point the SDKs at it with OPENAI_BASE_URL and
+LLAMA_CLOUD_BASE_URL (see benchmarks/run.py).
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import struct
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PDF_PAGE_RE = re.compile(rb"/Type\s*/Page(?!s)")
+
+class StubConfig:
+    def __init__(self, ttft: float = 0.3, tokens_per_second: float = 400.0, embedding_latency: float = 0.05,
+                 ocr_page_latency: float = 0.5, embedding_dim: int = 256):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.embedding_latency = embedding_latency
+        self.ocr_page_latency = ocr_page_latency
+        self.embedding_dim = embedding_dim
+
+def _approx_tokens(text: str) -> int:
+    return max(1, int(len(text.split()) / 0.75))
+
+def _answer_for(messages: list[dict]) -> str:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    question = messages[-1]["content"]
+    if "table planner" in system:
+        # Pick the first listed table: its first column as categories, the first numeric one as values
+        listing = question.split("\n")[1] if "\n" in question else ""
+        match = re.match(r"(t\d+):.*columns: (.*?) \|", listing)
+        if not match:
+            return json.dumps({"table": None})
+        columns = re.findall(r"([^,]+?) \((number|text)\)", match.group(2))
+        numeric = [name.strip() for name, kind in columns if kind == "number"]
+        return json.dumps({"table": match.group(1), "x": columns[0][0].strip(), "y": numeric[0] if numeric else None,
+                           "aggregation": "sum" if numeric else "count", "chart": "bar", "title": "Computed chart"})
+    if "reorganizer" in system:
+        # Reorganization returns the content itself, so output size tracks input size
+        return question.split("\n", 1)[-1].strip()
+    answer = "Based on the document, the main points are revenue growth, cost control and expansion plans."
+    if any(word in question.lower() for word in ("chart", "graph", "plot")):
+        chart = {"type": "bar", "x": ["Q1", "Q2", "Q3", "Q4"], "y": [12, 18, 15, 22], "title": "Quarterly values"}
+        answer += f"\n[CHART_DATA]{json.dumps(chart)}[/CHART_DATA]"
+    return answer
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = StubConfig()
+    jobs = {}
+    jobs_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    # ---- helpers ----
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    # ---- routing ----
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            return self._chat(json.loads(self._read_body()))
+        if path.endswith("/embeddings"):
+            return self._embeddings(json.loads(self._read_body()))
+        if path.endswith("/parsing/upload"):
+            return self._upload(self._read_body())
+        self._read_body()
+        self._send_json({"error": f"unknown route {path}"}, 404)
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        match = re.search(r"/parsing/job/([^/]+)(/result/(\w+))?$", path)
+        if not match:
+            return self._send_json({"error": f"unknown route {path}"}, 404)
+        with self.jobs_lock:
+            job = self.jobs.get(match.group(1))
+        if job is None:
+            return self._send_json({"detail": "job not found"}, 404)
+        done = time.time() >= job["ready_at"]
+        if not match.group(2):
+            return self._send_json({"id": match.group(1), "status": "SUCCESS" if done else "PENDING"})
+        pages = [{"page": i + 1, "md": f"# Page {i + 1}\n\nScanned text recognised on page {i + 1}."}
+                 for i in range(job["pages"])]
+        markdown = "\n\n".join(page["md"] for page in pages)
+        self._send_json({"markdown": markdown, "text": markdown, "pages": pages,
+                         "job_metadata": {"job_pages": job["pages"]}})
+
+    # ---- OpenAI ----
+    def _chat(self, request: dict):
+        messages = request["messages"]
+        answer = _answer_for(messages)
+        prompt_tokens = sum(_approx_tokens(m["content"]) for m in messages)
+        words = answer.split(" ")
+        completion_tokens = _approx_tokens(answer)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens, "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": request["model"]}
+        generation_time = completion_tokens / self.config.tokens_per_second
+
+        time.sleep(self.config.ttft)
+        if not request.get("stream"):
+            time.sleep(generation_time)
+            return self._send_json({**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}]})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        pieces = [" ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "") for i in range(0, len(words), 8)]
+        for piece in pieces:
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            time.sleep(generation_time / len(pieces))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def _embeddings(self, request: dict):
+        inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+        time.sleep(self.config.embedding_latency)
+        data = []
+        for i, text in enumerate(inputs):
+            seed = hashlib.sha256(str(text).encode("utf-8")).digest()
+            values = [((seed[j % 32] ^ j) % 200 - 100) / 100 for j in range(self.config.embedding_dim)]
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(struct.pack(f"{len(values)}f", *values)).decode()
+            else:
+                embedding = values
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(_approx_tokens(str(text)) for text in inputs)
+        self._send_json({"object": "list", "data": data, "model": request["model"],
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    # ---- LlamaParse ----
+    def _upload(self, body: bytes):
+        pages = max(1, len(PDF_PAGE_RE.findall(body)))
+        job_id = uuid.uuid4().hex
+        with self.jobs_lock:
+            self.jobs[job_id] = {"pages": pages, "ready_at": time.time() + pages * self.config.ocr_page_latency}
+        self._send_json({"id": job_id, "status": "PENDING"})
+
+def start_stub_server(config: StubConfig = None, port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread; port 0 picks a free port"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config or StubConfig(), "jobs": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the OpenAI/LlamaParse stand-in in the foreground")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tps", type=float, default=400.0, help="completion tokens per second")
+    parser.add_argument("--ocr-page-latency", type=float, default=0.5, help="seconds of OCR per page")
+    args = parser.parse_args()
+    server = start_stub_server(StubConfig(ttft=args.ttft, tokens_per_second=args.tps,
+                                          ocr_page_latency=args.ocr_page_latency), port=args.port)
+    print(f"Stub API listening on http://127.0.0.1:{server.server_port}")
+    print(f"  OPENAI_BASE_URL=http://127.0.0.1:{server.server_port}/v1")
+    print(f"  LLAMA_CLOUD_BASE_URL=http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
+
+if __name__ == "__main__":
+    main()
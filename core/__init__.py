@@ -0,0 +1,31 @@
+"""Extraction, reorganization, RAG and visualization pipeline behind the Streamlit app.
+
+Heavy backends (MarkItDown, LlamaParse, OpenAI, tiktoken, numpy, Plotly, Streamlit)
+are imported on first use, so importing this package is cheap for workers and tests.
+"""
+import warnings
+
+warnings.filterwarnings("ignore",
+                        message="builtin type (SwigPyPacked|SwigPyObject|swigvarlink) has no __module__ attribute",
+                        category=DeprecationWarning)
+
+from .tokens import count_tokens, get_encoder, plan_request, TokenCounter
+from .clients import RequestScheduler, SingleFlight, set_request_session, with_request_session, estimate_tokens
+from .extraction import convert_file, extract_document, extract_local, ExtractionCache, extraction_cache_key
+from .images import prepare_image, is_image
+from .compaction import compact_text, original_offset
+from .ingest import ingest_upload, ingested_upload, discard_upload
+from .reorganize import (plan_reorganize, reorganize_markdown, reorganize_markdown_stream, reorganize_sections,
+                         reorganize_markdown_parallel, split_structural_sections)
+from .retrieval import DocumentIndex, build_index, chunk_markdown, retrieve_context
+from .qa import rag, rag_batch, rag_documents, plan_rag, RagStream, RagSession, extract_chart_data
+from .tables import TableIndex, build_table_index, parse_markdown_tables, answer_from_tables, is_chart_question
+from .usage import record_usage, usage_totals
+from .telemetry import span, record_span, render_prometheus, stage_summary, start_metrics_server
+from .store import DocumentStore, get_document_store, document_id, workspace_owner
+from .session_store import SessionStore, SessionBlobs, get_session_store
+from .sections import SectionCache, get_section_cache, section_key
+from .answer_cache import AnswerCache, get_answer_cache, content_hash
+from .viewer import build_page_index, get_page_index, page_of, page_text, search_document
+from .visualization import create_visualization, chart_hash
+from .jobs import Job, submit_job, get_job, discard_job, extraction_job, reorganize_job, prefetch_job
@@ -0,0 +1,117 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from .clients import SingleFlight
+from .config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_SIMILARITY
+
+# ==== Answer Cache ====
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the document content an answer was generated from"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+class AnswerCache:
+    """Process-wide LRU cache of rag() answers keyed by (document hash, normalized question).
+
+    With similarity_threshold set, a question that misses exactly is also matched against
+    earlier questions on the same document by embedding cosine similarity. A question already
+    being answered by another session can be waited for instead of asked again (computing()/wait_for()).
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 similarity_threshold: float | None = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # (doc_hash, question) -> {"answer", "chart_data"}
+        self._vectors = OrderedDict()   # normalized question -> embedding
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def _embedding(self, question: str):
+        vector = self._vectors.get(question)
+        if vector is None:
+            from .retrieval import embed_texts
+            vector = embed_texts([question])[0]
+            with self._lock:
+                self._vectors[question] = vector
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+        return vector
+
+    def _similar(self, doc_hash: str, question: str) -> tuple | None:
+        try:
+            query = self._embedding(question)
+        except Exception as e:
+            print(f"[⚠️] Question embedding failed, exact answer cache only: {e}")
+            return None
+        with self._lock:
+            candidates = [(key, self._vectors.get(key[1])) for key in self._entries if key[0] == doc_hash]
+        best_key, best_score = None, self.similarity_threshold
+        for key, vector in candidates:
+            if vector is None:
+                continue
+            score = float(vector @ query)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def get(self, doc_hash: str, question: str) -> dict | None:
+        key = (doc_hash, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.similarity_threshold is not None:
+            similar = self._similar(doc_hash, key[1])
+            if similar is not None:
+                key = similar
+                with self._lock:
+                    entry = self._entries.get(key)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def contains(self, doc_hash: str, question: str) -> bool:
+        """Exact-match lookup that does not count as a hit or miss"""
+        with self._lock:
+            return (doc_hash, normalize_question(question)) in self._entries
+
+    def computing(self, doc_hash: str, question: str):
+        """Context manager marking an answer as being generated; put() it before the block ends"""
+        return self._flights.claim((doc_hash, normalize_question(question)))
+
+    def wait_for(self, doc_hash: str, question: str, timeout: float = None) -> bool:
+        """Block while another session generates this answer; True if one was in flight"""
+        return self._flights.wait((doc_hash, normalize_question(question)), timeout)
+
+    def in_flight(self, doc_hash: str, question: str) -> bool:
+        return self._flights.in_flight((doc_hash, normalize_question(question)))
+
+    def put(self, doc_hash: str, question: str, answer: str, chart_data: dict | None):
+        key = (doc_hash, normalize_question(question))
+        with self._lock:
+            self._entries[key] = {"answer": answer, "chart_data": chart_data}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache() -> AnswerCache:
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+    return _answer_cache
@@ -0,0 +1,262 @@
+"""Headless batch extraction over a directory tree or file list.
+
+Local MarkItDown conversion runs on a process pool; documents that need OCR, and the optional
+reorganization and library indexing, run on an async pool bounded by --concurrency (the API
+scheduler still applies its rate limits). Results go to --out, with a manifest.jsonl checkpoint
+written as each document finishes, so an interrupted run resumes where it stopped.
+
+    python -m core.batch docs/ --out extracted/
+    python -m core.batch docs/ scans/ --out extracted/ --reorganize --library team --concurrency 16
+    python -m core.batch --files-from todo.txt --out extracted/ --processes 8
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .compaction import compact_text
+from .config import BATCH_PROCESS_WORKERS, BATCH_CONCURRENCY, COMPACT_EXTRACTED_TEXT, DOCUMENT_LIBRARY_WORKSPACE
+from .extraction import extract_document, extract_local, file_sha256
+from .reorganize import (plan_reorganize, reorganize_markdown, reorganize_markdown_parallel, cached_reorganization,
+                         remember_reorganization)
+from .store import get_document_store, document_id, workspace_owner
+
+# ==== Inputs & Manifest ====
+
+MANIFEST_NAME = "manifest.jsonl"
+
+def collect_files(inputs: list[str], exclude: str = None) -> list[str]:
+    """Files named in inputs, with directories walked recursively (hidden entries and exclude skipped)"""
+    files = []
+    for item in inputs:
+        if os.path.isfile(item):
+            files.append(os.path.abspath(item))
+            continue
+        if not os.path.isdir(item):
+            print(f"[⚠️] Skipping {item}: no such file or directory")
+            continue
+        for root, dirs, names in os.walk(item):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".")
+                             and os.path.abspath(os.path.join(root, d)) != exclude)
+            files.extend(os.path.abspath(os.path.join(root, name)) for name in sorted(names) if not name.startswith("."))
+    return list(dict.fromkeys(files))
+
+def load_manifest(path: str) -> dict:
+    """Latest manifest entry per input path; a line cut short by an interruption is ignored"""
+    entries = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry["path"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+def _finished(entry: dict | None, path: str, options: dict) -> bool:
+    """Whether a manifest entry records this exact file as done with everything this run asks for"""
+    if not entry or entry["status"] != "ok":
+        return False
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False    # _process() records it as failed
+    if (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+        return False
+    if options["reorganize"] and not entry.get("organized_output"):
+        return False
+    if options["library"] and entry.get("options", {}).get("library") != options["library"]:
+        return False
+    return all(os.path.exists(os.path.join(options["out_dir"], name))
+               for name in (entry["output"], entry.get("organized_output")) if name)
+
+# ==== Pipeline ====
+
+def _local_stage(path: str, use_cache: bool) -> dict:
+    """Process-pool worker: hash the file and try the local extraction"""
+    started = time.perf_counter()
+    file_hash = file_sha256(path)
+    return {"sha256": file_hash, "extraction": extract_local(path, use_cache, file_hash),
+            "seconds": time.perf_counter() - started}
+
+def _remote_extraction(path: str, use_cache: bool, file_hash: str) -> dict:
+    return extract_document(path, use_cache=use_cache, file_hash=file_hash)
+
+def _reorganize(text: str) -> str:
+    if plan_reorganize(text)["strategy"] == "map_reduce":
+        return reorganize_markdown_parallel(text)
+    organized = cached_reorganization(text)
+    if organized is None:
+        organized = reorganize_markdown(text)
+        remember_reorganization(text, organized)
+    return organized
+
+def _save_to_library(owner: str, file_hash: str, name: str, extraction: dict, organized: str | None):
+    from .retrieval import build_index
+
+    store = get_document_store()
+    doc_id = document_id(owner, file_hash)
+    store.save_document(owner, doc_id, name, extraction["text"], build_index(extraction["text"]),
+                        extraction["extractor"], extraction["tokens"])
+    if organized:
+        store.save_organized(doc_id, organized, build_index(organized))
+
+def _write(path: str, text: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+async def _process(path: str, options: dict, pools: dict) -> dict:
+    """Extract (and optionally reorganize and index) one document, returning its manifest entry"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    timings = {"local": 0.0, "remote": 0.0, "reorganize": 0.0}
+    entry = {"path": path, "status": "failed", "error": None,
+             "options": {"reorganize": options["reorganize"], "library": options["library"]}}
+    try:
+        stat = os.stat(path)
+        entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        local = await loop.run_in_executor(pools["processes"], _local_stage, path, options["use_cache"])
+        timings["local"] = local["seconds"]
+        entry["sha256"] = local["sha256"]
+        extraction = local["extraction"]
+
+        async with pools["remote"]:
+            if extraction is None:
+                remote_started = time.perf_counter()
+                extraction = await asyncio.to_thread(_remote_extraction, path, options["use_cache"], local["sha256"])
+                timings["remote"] = time.perf_counter() - remote_started
+            if not extraction["text"]:
+                raise RuntimeError(extraction["error"] or "no content extracted")
+            if COMPACT_EXTRACTED_TEXT:
+                compaction = await asyncio.to_thread(compact_text, extraction["text"])
+                extraction = {**extraction, "text": compaction["text"], "tokens": compaction["tokens"]}
+
+            organized = None
+            if options["reorganize"]:
+                reorganize_started = time.perf_counter()
+                organized = await asyncio.to_thread(_reorganize, extraction["text"])
+                timings["reorganize"] = time.perf_counter() - reorganize_started
+            if options["library"]:
+                await asyncio.to_thread(_save_to_library, options["library"], local["sha256"], os.path.basename(path),
+                                        extraction, organized)
+
+        stem = f"{os.path.splitext(os.path.basename(path))[0]}-{local['sha256'][:12]}"
+        entry["output"] = f"{stem}.md"
+        await asyncio.to_thread(_write, os.path.join(options["out_dir"], entry["output"]), extraction["text"])
+        if organized is not None:
+            entry["organized_output"] = f"{stem}.organized.md"
+            await asyncio.to_thread(_write, os.path.join(options["out_dir"], entry["organized_output"]), organized)
+        entry.update(status="ok", extractor=extraction["extractor"], cache_hit=extraction["cache_hit"],
+                     tokens=extraction["tokens"])
+    except Exception as e:
+        entry["error"] = str(e)
+    timings["total"] = time.perf_counter() - started
+    entry.update(seconds={name: round(seconds, 3) for name, seconds in timings.items()}, finished=time.time())
+    return entry
+
+async def _run(files: list[str], options: dict, manifest) -> dict:
+    concurrency, process_workers = options["concurrency"], options["processes"]
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    # Documents in flight: enough to keep both pools busy without holding every text in memory
+    in_flight = asyncio.Semaphore(process_workers + concurrency)
+    counts = {"ok": 0, "failed": 0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")) as processes:
+        pools = {"processes": processes, "remote": asyncio.Semaphore(concurrency)}
+
+        async def run_one(path: str):
+            async with in_flight:
+                entry = await _process(path, options, pools)
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            counts[entry["status"]] += 1
+            done = counts["ok"] + counts["failed"]
+            seconds = entry["seconds"]
+            detail = (f"{entry['extractor']}{' (cached)' if entry['cache_hit'] else ''}, {entry['tokens']:,} tokens"
+                      if entry["status"] == "ok" else entry["error"])
+            print(f"[{'✔' if entry['status'] == 'ok' else '❌'}] {done}/{len(files)} {os.path.basename(path)}: "
+                  f"{detail} | local {seconds['local']:.2f}s, remote {seconds['remote']:.2f}s, "
+                  f"reorganize {seconds['reorganize']:.2f}s, total {seconds['total']:.2f}s")
+
+        await asyncio.gather(*(run_one(path) for path in files))
+
+    return {**counts, "seconds": time.perf_counter() - started}
+
+def run_batch(inputs: list[str], out_dir: str, reorganize: bool = False, library: str = None,
+              processes: int = BATCH_PROCESS_WORKERS, concurrency: int = BATCH_CONCURRENCY,
+              use_cache: bool = True) -> dict:
+    """Extract every file under inputs into out_dir, skipping files the manifest records as done.
+
+    Returns {"ok", "failed", "skipped", "seconds", "docs_per_second"}.
+    """
+    options = {"out_dir": out_dir, "reorganize": reorganize, "use_cache": use_cache,
+               "library": workspace_owner(library) if library else None,
+               "processes": processes, "concurrency": concurrency}
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+    files = collect_files(inputs, exclude=os.path.abspath(out_dir))
+    pending = [path for path in files if not _finished(previous.get(path), path, options)]
+    skipped = len(files) - len(pending)
+    if skipped:
+        print(f"[⚡] Resuming: {skipped} of {len(files)} documents already done.")
+    print(f"[🔀] Extracting {len(pending)} documents with {processes} processes and {concurrency} remote slots...")
+
+    with open(manifest_path, "a", encoding="utf-8") as manifest:
+        result = asyncio.run(_run(pending, options, manifest)) if pending else {"ok": 0, "failed": 0, "seconds": 0.0}
+
+    processed = result["ok"] + result["failed"]
+    result.update(skipped=skipped, docs_per_second=processed / result["seconds"] if result["seconds"] else 0.0)
+    print(f"[📊] {processed} documents in {result['seconds']:.1f}s ({result['docs_per_second']:.2f} docs/sec): "
+          f"{result['ok']} ok, {result['failed']} failed, {skipped} already done")
+    return result
+
+# ==== CLI ====
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Extract documents in bulk without the Streamlit app")
+    parser.add_argument("inputs", nargs="*", help="files or directories (walked recursively)")
+    parser.add_argument("--files-from", help="text file listing one input path per line")
+    parser.add_argument("--out", required=True, help="directory for the extracted markdown and manifest.jsonl")
+    parser.add_argument("--reorganize", action="store_true", help="also write the reorganized markdown")
+    parser.add_argument("--library", metavar="WORKSPACE", nargs="?", const="",
+                        help="also save each document to a workspace's library in the app "
+                             "(default DOCUMENT_LIBRARY_WORKSPACE)")
+    parser.add_argument("--processes", type=int, default=BATCH_PROCESS_WORKERS,
+                        help=f"local conversion processes (default {BATCH_PROCESS_WORKERS})")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help=f"documents in remote OCR/LLM calls at once (default {BATCH_CONCURRENCY})")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the extraction cache")
+    args = parser.parse_args(argv)
+
+    inputs = list(args.inputs)
+    if args.files_from:
+        with open(args.files_from, "r", encoding="utf-8") as f:
+            inputs.extend(line.strip() for line in f if line.strip())
+    if not inputs:
+        parser.error("no input files or directories given")
+    if args.library == "":
+        args.library = DOCUMENT_LIBRARY_WORKSPACE
+        if not args.library:
+            parser.error("--library needs a workspace name or DOCUMENT_LIBRARY_WORKSPACE")
+
+    try:
+        result = run_batch(inputs, args.out, reorganize=args.reorganize, library=args.library,
+                           processes=args.processes, concurrency=args.concurrency, use_cache=not args.no_cache)
+    except KeyboardInterrupt:
+        print("[⚠️] Interrupted; finished documents are in the manifest and the next run resumes from there.")
+        sys.exit(130)
+    sys.exit(1 if result["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import asyncio
+import contextvars
+import importlib
+import json
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+from .config import (LLAMA_API, OPENAI_MAX_CONCURRENCY, LLAMA_MAX_CONCURRENCY, API_MAX_RETRIES,
+                     BACKOFF_BASE_SECONDS, BACKOFF_MAX_SECONDS, OPENAI_RPM, OPENAI_TPM, LLAMA_RPM)
+
+# ==== Shared Clients ====
+# One instance per process: module state survives Streamlit reruns and is shared by all sessions.
+
+_lock = threading.Lock()
+_clients = {}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+def _shared(name: str, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def openai_client():
+    """Process-wide OpenAI client, so every call reuses its keep-alive connection pool.
+
+    SDK retries are disabled; call_with_retry() handles backoff and concurrency instead.
+    """
+    def factory():
+        from openai import OpenAI
+        return OpenAI(max_retries=0)
+    return _shared("openai", factory)
+
+def markitdown_converter():
+    """Process-wide MarkItDown converter"""
+    def factory():
+        from markitdown import MarkItDown
+        return MarkItDown(enable_plugins=False)
+    return _shared("markitdown", factory)
+
+def llama_parser():
+    """Process-wide LlamaParse client returning markdown"""
+    def factory():
+        from llama_parse import LlamaParse
+        return LlamaParse(api_key=LLAMA_API, result_type="markdown")
+    return _shared("llama_parse", factory)
+
+# LlamaParse's sync API starts a new event loop per call, but the parser keeps one async HTTP
+# client bound to the first loop, so later calls (and concurrent ones from other threads) fail.
+# Every parse runs on one long-lived loop thread instead, which also keeps its connections alive.
+_llama_loop = None
+
+def _llama_event_loop():
+    global _llama_loop
+    with _lock:
+        if _llama_loop is None:
+            _llama_loop = asyncio.new_event_loop()
+            threading.Thread(target=_llama_loop.run_forever, name="llama-parse-loop", daemon=True).start()
+    return _llama_loop
+
+def llama_parse_file(path: str) -> list:
+    """Parse a file with the process-wide LlamaParse client, returning its documents"""
+    return asyncio.run_coroutine_threadsafe(llama_parser().aload_data(path), _llama_event_loop()).result()
+
+# ==== Request Sessions ====
+# Requests are queued per session so the scheduler can serve sessions in turn. The app sets the
+# session on its script thread; work handed to pool threads carries it via with_request_session().
+
+_request_session = contextvars.ContextVar("request_session", default="default")
+
+def set_request_session(session_id: str):
+    _request_session.set(session_id)
+
+def with_request_session(fn):
+    """Wrap fn to run under the caller's request session, for submitting to pool threads"""
+    session = _request_session.get()
+
+    def run(*args, **kwargs):
+        token = _request_session.set(session)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_session.reset(token)
+    return run
+
+# ==== Rate Limiting ====
+
+class TokenBucket:
+    """Refills per_minute units evenly over a minute, holding at most a minute's worth"""
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount is available (requests larger than the bucket wait for a full one)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+class RequestScheduler:
+    """Admits one backend's requests under a concurrency limit and requests/tokens-per-minute buckets.
+
+    Waiting requests are queued per session and served round-robin, so one session's burst (a
+    map-reduce reorganization, a prefetch batch) cannot starve the others. A rate-limit response
+    pauses the whole backend for its Retry-After instead of letting every queued request hit it.
+    """
+
+    def __init__(self, max_concurrency: int, rpm: float = None, tpm: float = None, clock=time.monotonic):
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.requests = TokenBucket(rpm, clock) if rpm else None
+        self.tokens = TokenBucket(tpm, clock) if tpm else None
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._queues = OrderedDict()   # session -> deque of waiting tickets, in serving order
+        self._cond = threading.Condition()
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [self.paused_until - self.clock()]
+        if self.requests:
+            waits.append(self.requests.wait_time(1))
+        if self.tokens and tokens:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def _dequeue(self, session: str, ticket: object):
+        queue = self._queues[session]
+        queue.remove(ticket)
+        if queue:
+            self._queues.move_to_end(session)   # the session's next request goes behind the others
+        else:
+            del self._queues[session]
+
+    def acquire(self, tokens: int = 0, session: str = None):
+        session = session or _request_session.get()
+        ticket = object()
+        with self._cond:
+            self._queues.setdefault(session, deque()).append(ticket)
+            try:
+                while True:
+                    head = next(iter(self._queues.values()))[0]
+                    if head is ticket and self.in_flight < self.max_concurrency:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._dequeue(session, ticket)
+                self._cond.notify_all()
+                raise
+            self._dequeue(session, ticket)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens and tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Hold back every queued request of this backend for seconds"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+_schedulers = {
+    "openai": RequestScheduler(OPENAI_MAX_CONCURRENCY, rpm=OPENAI_RPM, tpm=OPENAI_TPM),
+    "llama_parse": RequestScheduler(LLAMA_MAX_CONCURRENCY, rpm=LLAMA_RPM),
+}
+
+def estimate_tokens(messages: list[dict] = None, input=None, max_tokens: int = None, **_) -> int:
+    """tiktoken estimate of the tokens an OpenAI request counts against tokens-per-minute"""
+    from .tokens import get_encoder
+    if messages:
+        texts = [message["content"] for message in messages if isinstance(message.get("content"), str)]
+    else:
+        texts = [input] if isinstance(input, str) else list(input or [])
+    return sum(len(get_encoder().encode(text)) for text in texts) + (max_tokens or 0)
+
+@contextmanager
+def concurrency_slot(backend: str, **request):
+    """Hold one of the backend's in-flight request slots, waiting for its rate limits.
+
+    request is the call's keyword arguments (messages, input, max_tokens), used to estimate
+    the tokens it will count against the backend's tokens-per-minute limit.
+    """
+    scheduler = _schedulers[backend]
+    scheduler.acquire(estimate_tokens(**request) if scheduler.tokens else 0)
+    try:
+        yield
+    finally:
+        scheduler.release()
+
+# ==== Request Coalescing ====
+
+class SingleFlight:
+    """Runs one call per key at a time; identical concurrent calls wait for it and share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self, key) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def wait(self, key, timeout: float = None) -> bool:
+        """Block while a call with key runs; True if there was one"""
+        with self._lock:
+            call = self._calls.get(key)
+        return call is not None and call["done"].wait(timeout)
+
+    @contextmanager
+    def claim(self, key):
+        """Mark key as in flight for the duration of the block (for callers that render as they go)"""
+        call = {"done": threading.Event(), "result": None, "error": None}
+        with self._lock:
+            self._calls.setdefault(key, call)
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call["done"].set()
+
+    def do(self, key, fn) -> tuple:
+        """Return (fn(), shared), where shared is True when another caller's result was reused"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+        try:
+            call["result"] = fn()
+            return call["result"], False
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+_flights = SingleFlight()
+
+def _flight_key(backend: str, fn, args: tuple, kwargs: dict) -> str | None:
+    if kwargs.get("stream"):
+        return None
+    try:
+        payload = json.dumps([args, kwargs], sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+    return f"{backend}|{id(getattr(fn, '__self__', None))}|{getattr(fn, '__qualname__', fn)}|{payload}"
+
+def _without_usage(result):
+    """A coalesced caller shares the response but must not record its tokens a second time"""
+    if getattr(result, "usage", None) is not None and hasattr(result, "model_copy"):
+        return result.model_copy(update={"usage": None})
+    return result
+
+# ==== Retry ====
+
+def _status_code(exc: Exception) -> int | None:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+def _retry_after(exc: Exception) -> float | None:
+    """Seconds the server asked us to wait, from Retry-After / retry-after-ms headers"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+_connection_errors = None
+
+def _connection_error_types() -> tuple:
+    """Connection-level exception types of whichever HTTP stacks are installed"""
+    global _connection_errors
+    if _connection_errors is None:
+        types = [ConnectionError, TimeoutError]
+        for module, name in (("openai", "APIConnectionError"), ("httpx", "TransportError")):
+            try:
+                types.append(getattr(importlib.import_module(module), name))
+            except (ImportError, AttributeError):
+                pass
+        _connection_errors = tuple(types)
+    return _connection_errors
+
+def _is_retryable(exc: Exception) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return isinstance(exc, _connection_error_types())
+
+def call_with_retry(fn, *args, backend: str = "openai", acquire: bool = True,
+                    max_retries: int = API_MAX_RETRIES, **kwargs):
+    """Call fn with jittered exponential backoff on 429/5xx/connection errors.
+
+    Honours Retry-After when the server sends it, pausing the whole backend. With acquire=True
+    the call waits for one of the backend's scheduler slots; pass acquire=False when the caller
+    already holds one. Identical non-streaming calls already in flight are not sent again: the
+    duplicate waits for the first and shares its response.
+    """
+    key = _flight_key(backend, fn, args, kwargs) if acquire else None
+    if key is None:
+        return _call_with_retry(fn, args, kwargs, backend, acquire, max_retries)
+    result, shared = _flights.do(key, lambda: _call_with_retry(fn, args, kwargs, backend, acquire, max_retries))
+    if shared:
+        print(f"[🔀] Coalesced an identical in-flight {backend} request")
+        return _without_usage(result)
+    return result
+
+def _call_with_retry(fn, args: tuple, kwargs: dict, backend: str, acquire: bool, max_retries: int):
+    attempt = 0
+    while True:
+        try:
+            if acquire:
+                with concurrency_slot(backend, **kwargs):
+                    return fn(*args, **kwargs)
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            elif _status_code(e) == 429:
+                _schedulers[backend].pause(min(delay, BACKOFF_MAX_SECONDS))
+            attempt += 1
+            print(f"[⏳] {backend} request failed ({e.__class__.__name__}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(min(delay, BACKOFF_MAX_SECONDS))
@@ -0,0 +1,187 @@
+import bisect
+import re
+from collections import Counter
+
+from .config import COMPACTION_EDGE_LINES, COMPACTION_REPEAT_RATIO, COMPACTION_MIN_BLOCK_CHARS
+from .telemetry import span
+from .tokens import count_tokens
+
+# ==== Context Compaction ====
+# Extracted text is compacted once, before it is reorganized, indexed or sent with questions:
+# running page headers/footers, page numbers, padding, repeated table borders and duplicated
+# boilerplate blocks are dropped. Only lines repeated verbatim are removed, and never headings,
+# so per-page facts like "Headcount: 20" or "Chapter 3" survive. The result is deterministic.
+
+PAGE_MARKER_RE = re.compile(r"^\s*<!--\s*page\b.*-->\s*$", re.IGNORECASE)
+# Explicit page numbers: "Page 3", "page 3 of 10", "- 3 -". A bare "3" needs the sequence check below.
+PAGE_NUMBER_RE = re.compile(r"^(page\s*#(\s*(of|/)\s*#)?|[-–—]+\s*#\s*[-–—]+)$", re.IGNORECASE)
+# A border needs a pipe or "+": a bare run of dashes is a thematic break or text
+TABLE_BORDER_RE = re.compile(r"^\s*(\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)+\|?|\|\s*:?-+:?\s*\||\+[-=+]+\+)\s*$")
+HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s")
+INNER_SPACE_RE = re.compile(r"(?<=\S)[ \t]{2,}")
+
+def _pages(lines: list[str]) -> list[list[int]]:
+    """Line numbers of each page, split at form feeds and <!-- page N --> markers"""
+    pages, current = [], []
+    for i, line in enumerate(lines):
+        if current and (line.startswith("\f") or PAGE_MARKER_RE.match(line)):
+            pages.append(current)
+            current = []
+        current.append(i)
+    if current:
+        pages.append(current)
+    return pages
+
+def _edge_key(line: str) -> str:
+    return re.sub(r"\s+", " ", line.strip("\f").strip().lower())
+
+def _is_page_number(key: str) -> bool:
+    return bool(PAGE_NUMBER_RE.match(re.sub(r"\d+", "#", key)))
+
+def _numbered_pages(lines: list[str], contents: list[list[int]], edge_lines: int, min_pages: float) -> set:
+    """Bare numbers that number the pages: at the same edge position on enough pages, counting up by one per page"""
+    positions = {}
+    for page, content in enumerate(contents):
+        for k, i in enumerate(content[:edge_lines]):
+            positions.setdefault(("top", k), {})[page] = i
+        for k, i in enumerate(reversed(content[-edge_lines:])):
+            positions.setdefault(("bottom", k), {})[page] = i
+    numbers = set()
+    for found in positions.values():
+        found = {page: i for page, i in found.items() if lines[i].strip("\f").strip().isdigit()}
+        if len(found) < min_pages:
+            continue
+        starts = {int(lines[i].strip("\f").strip()) - page for page, i in found.items()}
+        # One start shared by every page (front matter may be unnumbered), and a plausible one: a year
+        # or an amount at the foot of each page does not count up from the page count
+        if len(starts) == 1 and 1 - len(contents) <= starts.pop() <= len(contents):
+            numbers.update(found.values())
+    return numbers
+
+def _running_lines(lines: list[str], edge_lines: int, repeat_ratio: float) -> tuple[set, set]:
+    """(running header/footer lines, page number lines) found at the top or bottom of pages"""
+    pages = _pages(lines)
+    if len(pages) < 2:
+        return set(), set()
+    contents = [[i for i in page if lines[i].strip("\f").strip() and not PAGE_MARKER_RE.match(lines[i])
+                 and "|" not in lines[i] and not HEADING_RE.match(lines[i].strip("\f"))] for page in pages]
+    edges = [set(content[:edge_lines] + content[-edge_lines:]) for content in contents]
+    counts = Counter(key for page in edges for key in {_edge_key(lines[i]) for i in page})
+    threshold = max(3, len(pages) * repeat_ratio)
+
+    numbers = _numbered_pages(lines, contents, edge_lines, max(2, len(pages) * repeat_ratio))
+    running, seen = set(), set()
+    for page in edges:
+        for i in sorted(page):
+            key = _edge_key(lines[i])
+            if i in numbers or key.isdigit():   # numeric data lines are never running lines
+                continue
+            if _is_page_number(key):
+                numbers.add(i)
+            elif counts[key] >= threshold:
+                if key in seen:     # the first occurrence stays, e.g. a report title
+                    running.add(i)
+                seen.add(key)
+    return running, numbers
+
+def _normalize_line(line: str) -> str:
+    """Trailing whitespace, inner runs of spaces and table cell padding"""
+    line = line.rstrip()
+    indent = line[:len(line) - len(line.lstrip())]
+    body = line.lstrip()
+    if body.startswith("|") and body.endswith("|") and len(body) > 1:
+        cells = [cell.strip() for cell in body[1:-1].split("|")]
+        if all(re.fullmatch(r":?-+:?", cell) for cell in cells):
+            cells = [f"{':' if cell.startswith(':') else ''}---{':' if cell.endswith(':') and len(cell) > 1 else ''}"
+                     for cell in cells]
+        return indent + "| " + " | ".join(cells) + " |"
+    return indent + INNER_SPACE_RE.sub(" ", body)
+
+def compact_text(text: str, edge_lines: int = COMPACTION_EDGE_LINES, repeat_ratio: float = COMPACTION_REPEAT_RATIO,
+                 min_block_chars: int = COMPACTION_MIN_BLOCK_CHARS) -> dict:
+    """Compact extracted text for the model.
+
+    Returns {"text", "original_text", "compact_starts", "original_starts", "removed", "original_tokens",
+    "tokens", "tokens_saved"}; original_offset() maps an offset in "text" back to "original_text".
+    Fenced code blocks are only stripped of trailing whitespace.
+    """
+    with span("compaction", backend="local", input_bytes=len(text.encode("utf-8"))):
+        lines = text.split("\n")
+        offsets, position = [], 0
+        for line in lines:
+            offsets.append(position)
+            position += len(line) + 1
+        running, numbers = _running_lines(lines, edge_lines, repeat_ratio)
+        removed = {"running_lines": len(running), "page_numbers": len(numbers), "table_borders": 0,
+                   "duplicate_blocks": 0, "blank_lines": 0}
+
+        # Line pass: drop running lines, normalize the rest, drop repeated borders and blank runs
+        # (previous starts blank, so leading blank lines go too)
+        kept, in_fence, previous = [], False, ""
+        for i, line in enumerate(lines):
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+            elif in_fence:
+                kept.append((offsets[i], line.rstrip()))
+                continue
+            if i in running or i in numbers:
+                continue
+            line = _normalize_line(line)
+            if not line.strip():
+                if not previous.strip():
+                    removed["blank_lines"] += 1
+                    continue
+            elif TABLE_BORDER_RE.match(line) and TABLE_BORDER_RE.match(previous):
+                removed["table_borders"] += 1
+                continue
+            kept.append((offsets[i], line))
+            previous = line
+
+        # Block pass: a long block identical to an earlier one is boilerplate
+        output, seen, block, in_fence = [], set(), [], False
+
+        def flush():
+            key = "\n".join(line for _, line in block)
+            if len(key) >= min_block_chars and key in seen:
+                removed["duplicate_blocks"] += 1
+                if output and not output[-1][1].strip():
+                    output.pop()    # and the blank line that separated it
+            else:
+                seen.add(key)
+                output.extend(block)
+            block.clear()
+
+        for original, line in kept:
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+            if in_fence or line.lstrip().startswith("```") or line.strip():
+                block.append((original, line))
+            else:
+                flush()
+                output.append((original, line))
+        flush()
+        while output and not output[-1][1].strip():
+            output.pop()
+
+        compacted = "\n".join(line for _, line in output)
+        compact_starts, original_starts, position = [], [], 0
+        for original, line in output:
+            compact_starts.append(position)
+            original_starts.append(original)
+            position += len(line) + 1
+
+    original_tokens = count_tokens(text)
+    tokens = count_tokens(compacted)
+    if original_tokens > tokens:
+        print(f"[✂️] Compaction saved {original_tokens - tokens:,} of {original_tokens:,} tokens "
+              f"({(original_tokens - tokens) / original_tokens:.0%})")
+    return {"text": compacted, "original_text": text, "compact_starts": compact_starts,
+            "original_starts": original_starts, "removed": removed, "original_tokens": original_tokens,
+            "tokens": tokens, "tokens_saved": original_tokens - tokens}
+
+def original_offset(compaction: dict, offset: int) -> int:
+    """Offset in the extracted text of a character offset in the compacted text (line precision)"""
+    i = bisect.bisect_right(compaction["compact_starts"], offset) - 1
+    if i < 0:
+        return 0
+    return compaction["original_starts"][i] + (offset - compaction["compact_starts"][i])
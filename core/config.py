@@ -0,0 +1,105 @@
+import os
+import tempfile
+
+# ==== Config ====
+LLAMA_API = os.getenv("LLAMA_API_PARSE")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+LLM_MODEL = "gpt-4.1-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# ==== Model Limits ====
+MODEL_LIMITS = {
+    "gpt-4.1": {"context": 1_047_576, "max_output": 32_768},
+    "gpt-4.1-mini": {"context": 1_047_576, "max_output": 32_768},
+    "gpt-4.1-nano": {"context": 1_047_576, "max_output": 32_768},
+    "gpt-4o": {"context": 128_000, "max_output": 16_384},
+    "gpt-4o-mini": {"context": 128_000, "max_output": 16_384},
+    "gpt-4-turbo": {"context": 128_000, "max_output": 4_096},
+}
+DEFAULT_MODEL_LIMITS = {"context": 128_000, "max_output": 4_096}
+RAG_OUTPUT_TOKENS = 2000      # expected answer length reserved when planning a RAG request
+
+# ==== Extraction Cache Config ====
+CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", os.path.join(tempfile.gettempdir(), "extraction_cache"))
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+EXTRACTION_VERSION = "3"      # bump when convert_file() output changes
+OCR_MIN_PAGE_CHARS = 20       # PDF pages with fewer alphanumeric characters are OCR'd
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", 4))  # concurrent page OCR jobs
+
+# ==== OCR Image Config ====
+OCR_IMAGE_PREP = os.getenv("OCR_IMAGE_PREP", "1") != "0"  # shrink images locally before OCR upload
+OCR_IMAGE_DPI = 300               # images recording a higher DPI are downscaled to it
+OCR_IMAGE_MAX_SIDE = 3508         # long side in pixels (A4 at 300 DPI)
+OCR_IMAGE_JPEG_QUALITY = 85
+
+# ==== Compaction Config ====
+COMPACT_EXTRACTED_TEXT = os.getenv("COMPACT_EXTRACTED_TEXT", "1") != "0"  # compact text before it reaches the model
+COMPACTION_EDGE_LINES = 3         # lines at the top and bottom of each page checked for running headers/footers
+COMPACTION_REPEAT_RATIO = 0.5     # share of pages an edge line must repeat on to count as running
+COMPACTION_MIN_BLOCK_CHARS = 80   # shorter repeated blocks are kept (table rows, short labels)
+
+# ==== Document Store Config ====
+STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", os.path.join(os.path.expanduser("~"), ".data_extraction_rag", "store"))
+# Stored documents belong to an owner: the signed-in user (st.login), or this shared workspace when
+# it is set. Sessions with neither (e.g. anonymous visitors of a public deployment) get no library.
+DOCUMENT_LIBRARY_WORKSPACE = os.getenv("DOCUMENT_LIBRARY_WORKSPACE") or None
+# Reorganized sections and chunk embeddings kept for reuse by revised documents
+SECTION_CACHE_MAX_ENTRIES = int(os.getenv("SECTION_CACHE_MAX_ENTRIES", 50_000))
+
+# ==== Upload Config ====
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "extraction_uploads"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # uploads are copied to disk in blocks of this size
+UPLOAD_TTL_SECONDS = 6 * 3600     # orphaned uploads older than this are swept
+
+# ==== Reorganization Config ====
+REORGANIZE_SECTION_TOKENS = 6000  # documents above this are reorganized section by section
+REORGANIZE_WORKERS = 4            # concurrent section requests
+
+# ==== Retrieval Config ====
+CHUNK_MAX_TOKENS = 400        # upper bound for a single indexed chunk
+RAG_TOP_K = 6                 # chunks sent to the model per question
+RAG_TOKEN_BUDGET = 3000       # max content tokens sent per question
+HYBRID_ALPHA = 0.5            # weight of BM25 vs. embedding similarity
+RAG_SESSION_MAX_TURNS = 6     # earlier exchanges replayed after the cached prefix in session mode
+RAG_BATCH_WORKERS = 4         # concurrent questions in rag_batch()
+CHART_PLANNER_MODEL = os.getenv("CHART_PLANNER_MODEL", LLM_MODEL)  # picks table/columns for chart questions
+
+# ==== API Client Config ====
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 8))   # in-flight OpenAI requests per process
+LLAMA_MAX_CONCURRENCY = int(os.getenv("LLAMA_MAX_CONCURRENCY", 4))     # in-flight LlamaParse jobs per process
+# Requests/tokens per minute shared by all sessions (match the account's tier); unset disables a limit
+OPENAI_RPM = float(os.getenv("OPENAI_RPM")) if os.getenv("OPENAI_RPM") else None
+OPENAI_TPM = float(os.getenv("OPENAI_TPM")) if os.getenv("OPENAI_TPM") else None
+LLAMA_RPM = float(os.getenv("LLAMA_RPM")) if os.getenv("LLAMA_RPM") else None
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", 5))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+# ==== Answer Cache Config ====
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1024))
+# Cosine similarity for matching paraphrased questions; unset disables embedding lookups
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY")) if os.getenv("ANSWER_CACHE_SIMILARITY") else None
+
+# ==== Batch Config ====
+BATCH_PROCESS_WORKERS = int(os.getenv("BATCH_PROCESS_WORKERS", os.cpu_count() or 2))  # local MarkItDown conversions
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))  # documents in remote OCR/LLM calls at once
+
+# ==== Session State Config ====
+SESSION_STORE_DIR = os.getenv("SESSION_STORE_DIR", os.path.join(tempfile.gettempdir(), "session_store"))
+SESSION_MEMORY_BUDGET = int(os.getenv("SESSION_MEMORY_BUDGET_MB", 512)) * 1024 * 1024  # all sessions' values in memory
+SESSION_TTL_SECONDS = 24 * 3600   # session files left by an earlier process are removed after this long
+SESSION_HISTORY_IN_MEMORY = 5     # Q&A entries kept in st.session_state; older ones are archived to disk
+
+# ==== Background Job Config ====
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))               # extraction/reorganization jobs run concurrently
+JOB_TTL_SECONDS = 3600                                      # finished jobs are forgotten after this long
+
+# ==== Viewer Config ====
+VIEWER_PAGE_CHARS = 20_000    # characters sent to the browser per page of the document viewer
+
+# ==== Visualization Config ====
+FIGURE_CACHE_SIZE = 256       # Plotly figures memoized by chart-data hash
+
+# ==== Telemetry Config ====
+TRACE_LOG_PATH = os.getenv("PIPELINE_TRACE_LOG")            # JSONL span log; unset disables it
+METRICS_PORT = os.getenv("PIPELINE_METRICS_PORT")           # serve Prometheus /metrics when set
@@ -0,0 +1,276 @@
+import os
+import json
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from importlib import metadata
+
+from .clients import markitdown_converter, llama_parse_file, call_with_retry, with_request_session
+from .config import CACHE_DIR, CACHE_MAX_BYTES, EXTRACTION_VERSION, OCR_MIN_PAGE_CHARS, OCR_WORKERS, OCR_IMAGE_PREP
+from .images import is_image, prepare_image
+from .telemetry import span
+from .tokens import count_tokens
+
+# ==== Extraction ====
+
+def _ocr(path: str) -> str:
+    """OCR a file with LlamaParse, joining every document it returns"""
+    with span("ocr", backend="llama_parse", input_bytes=os.path.getsize(path)):
+        documents = call_with_retry(llama_parse_file, path, backend="llama_parse")
+    return "\n\n".join(doc.text for doc in documents or [] if doc.text)
+
+def _pdf_page_texts(path: str) -> list[str] | None:
+    """Text layer of each PDF page, or None when pypdf is unavailable or the file is unreadable"""
+    try:
+        from pypdf import PdfReader
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    except Exception as e:
+        print(f"[⚠️] Page-level inspection unavailable: {e}")
+        return None
+
+def _has_text_layer(text: str) -> bool:
+    return sum(ch.isalnum() for ch in text) >= OCR_MIN_PAGE_CHARS
+
+def _mixed_pdf_pages(path: str) -> list[str] | None:
+    """Page texts of a PDF with both digital and scanned pages, else None"""
+    if os.path.splitext(path)[1].lower() != ".pdf":
+        return None
+    page_texts = _pdf_page_texts(path)
+    if page_texts and any(_has_text_layer(t) for t in page_texts) and not all(_has_text_layer(t) for t in page_texts):
+        return page_texts
+    return None
+
+def _markitdown(path: str) -> str:
+    with span("convert", backend="markitdown", input_bytes=os.path.getsize(path)):
+        return markitdown_converter().convert(path).text_content
+
+def _extract_mixed_pdf(path: str, page_texts: list[str], on_progress=None) -> str:
+    """Keep the text layer of digital pages and OCR only the scanned ones, concurrently"""
+    from pypdf import PdfReader, PdfWriter
+
+    scanned = [i for i, text in enumerate(page_texts) if not _has_text_layer(text)]
+    print(f"[🔍] OCR for {len(scanned)} of {len(page_texts)} pages...")
+    reader = PdfReader(path)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        page_paths = []
+        for i in scanned:
+            writer = PdfWriter()
+            writer.add_page(reader.pages[i])
+            page_path = os.path.join(tmp_dir, f"page_{i + 1}.pdf")
+            with open(page_path, "wb") as f:
+                writer.write(f)
+            page_paths.append(page_path)
+
+        ocr_texts = _ocr_pages(dict(zip(scanned, page_paths)), len(page_texts), on_progress)
+
+    pages = [ocr_texts.get(i, text).strip() for i, text in enumerate(page_texts)]
+    return "\n\n".join(f"<!-- page {i + 1} -->\n{text}" for i, text in enumerate(pages) if text)
+
+def _ocr_pages(page_paths: dict, total: int, on_progress=None) -> dict:
+    """OCR {page number: file} concurrently, returning {page number: text}"""
+    done = total - len(page_paths)
+    if on_progress:
+        on_progress(done, total, f"OCR for {len(page_paths)} pages")
+    ocr_texts = {}
+    with ThreadPoolExecutor(max_workers=OCR_WORKERS) as executor:
+        futures = {executor.submit(with_request_session(_ocr), page_path): i for i, page_path in page_paths.items()}
+        for future in as_completed(futures):
+            ocr_texts[futures[future]] = future.result()
+            done += 1
+            if on_progress:
+                on_progress(done, total, f"Parsed page {futures[future] + 1}")
+    return ocr_texts
+
+def _ocr_image(path: str, on_progress=None) -> str:
+    """OCR an image after shrinking it locally; multi-page TIFFs are OCR'd page by page in parallel"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            pages = prepare_image(path, tmp_dir)["pages"]
+        except Exception as e:
+            print(f"[⚠️] Image preparation failed ({e}), uploading the original")
+            return _ocr(path)
+        if len(pages) == 1:
+            return _ocr(pages[0])
+        ocr_texts = _ocr_pages(dict(enumerate(pages)), len(pages), on_progress)
+    return "\n\n".join(f"<!-- page {i + 1} -->\n{ocr_texts[i].strip()}" for i in range(len(pages)) if ocr_texts[i].strip())
+
+def _convert_with_backend(path: str, on_progress=None) -> tuple[str, str, str | None]:
+    """Convert file to text, returning (text, extractor used, error message).
+
+    on_progress(done, total, message) is called as pages are parsed, when given.
+    """
+    report = on_progress or (lambda done, total, message: None)
+    page_texts = _mixed_pdf_pages(path)
+    if page_texts:
+        try:
+            return _extract_mixed_pdf(path, page_texts, on_progress), "hybrid", None
+        except Exception as e:
+            print(f"[❌] Page-level extraction failed ({e}). Falling back to whole-document extraction...")
+
+    try:
+        print("[🔍] Trying structured text extraction via MarkItDown...")
+        report(0, 1, "Structured text extraction (MarkItDown)")
+        text = _markitdown(path)
+        if text.strip():
+            print(f"[✔] Markdown extracted.")
+            report(1, 1, "Markdown extracted")
+            return text, "markitdown", None
+        else:
+            print("[⚠️] No structured text found. Fallback to OCR...")
+    except Exception:
+        print(f"[❌] MarkItDown failed. Fallback to OCR...")
+
+    print("[🔍] OCR Started...")
+    report(0, 1, "OCR (LlamaParse)")
+    try:
+        text = _ocr_image(path, on_progress) if OCR_IMAGE_PREP and is_image(path) else _ocr(path)
+
+        if not text:
+            print("[❌] Failed to parse the document - no content returned")
+            return "", "llama_parse", "Failed to parse the document - no content returned"
+
+        return text, "llama_parse", None
+
+    except Exception as e:
+        print(f"[❌] Error parsing document: {str(e)}")
+        return "", "llama_parse", f"Error parsing document: {str(e)}"
+
+def convert_file(path: str) -> str:
+    """Convert file to text (prefer structured, fallback to OCR)"""
+    return extract_document(path)["text"]
+
+# ==== Extraction Cache ====
+
+def _package_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extraction_cache_key(path: str, file_hash: str = None) -> str:
+    """SHA-256 of the file bytes plus the extractor pipeline and versions.
+
+    Pass file_hash when the bytes were already hashed (e.g. during upload ingestion).
+    """
+    pipeline = (f"markitdown={_package_version('markitdown')};"
+                f"llama_parse={_package_version('llama-parse')};"
+                f"pypdf={_package_version('pypdf')};v{EXTRACTION_VERSION}")
+    return hashlib.sha256(f"{file_hash or file_sha256(path)}|{pipeline}".encode()).hexdigest()
+
+class ExtractionCache:
+    """Content-addressed on-disk cache shared by every session on the host.
+
+    Entries are written atomically (temp file + rename) and evicted least-recently-used
+    once the directory grows past max_bytes.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # mark as recently used
+            return entry
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: dict):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+_extraction_cache = None
+
+def get_extraction_cache() -> ExtractionCache:
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache()
+    return _extraction_cache
+
+def extract_document(path: str, use_cache: bool = True, on_progress=None, file_hash: str = None) -> dict:
+    """Extract a document, reusing a cached result for identical bytes.
+
+    Returns a dict with text, tokens, extractor, cache_hit and error.
+    """
+    key = extraction_cache_key(path, file_hash) if use_cache else None
+    if key:
+        cached = get_extraction_cache().get(key)
+        if cached is not None:
+            print(f"[⚡] Extraction cache hit ({cached['extractor']}).")
+            return {**cached, "cache_hit": True, "error": None}
+
+    text, extractor, error = _convert_with_backend(path, on_progress)
+    return {**_remember_extraction(key, text, extractor), "cache_hit": False, "error": error}
+
+def _remember_extraction(key: str | None, text: str, extractor: str) -> dict:
+    entry = {"text": text, "tokens": count_tokens(text) if text else 0, "extractor": extractor}
+    if key and text:
+        try:
+            get_extraction_cache().put(key, entry)
+        except OSError as e:
+            print(f"[⚠️] Could not write extraction cache: {e}")
+    return entry
+
+def extract_local(path: str, use_cache: bool = True, file_hash: str = None) -> dict | None:
+    """Extract a document without remote calls: the cached result or MarkItDown's text.
+
+    Returns None when the document needs OCR (no text layer, a MarkItDown failure, or a PDF with
+    scanned pages); extract_document() then finishes it. Safe to run in a worker process.
+    """
+    key = extraction_cache_key(path, file_hash) if use_cache else None
+    cached = get_extraction_cache().get(key) if key else None
+    if cached is not None:
+        return {**cached, "cache_hit": True, "error": None}
+    if _mixed_pdf_pages(path):
+        return None
+    try:
+        text = _markitdown(path)
+    except Exception:
+        return None
+    if not text.strip():
+        return None
+    return {**_remember_extraction(key, text, "markitdown"), "cache_hit": False, "error": None}
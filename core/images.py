@@ -0,0 +1,70 @@
+import io
+import os
+
+from .config import OCR_IMAGE_DPI, OCR_IMAGE_MAX_SIDE, OCR_IMAGE_JPEG_QUALITY
+from .telemetry import span
+
+# ==== Image Preparation ====
+# Photos and scans are shrunk locally before OCR upload: upright, grayscale, no larger than OCR
+# needs, recompressed, and multi-page TIFFs split so their pages are OCR'd in parallel.
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp", ".gif"}
+
+def is_image(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+def _scale(image, dpi: int, max_side: int) -> float:
+    """Downscale factor: to dpi when the file records a higher one, and to max_side pixels"""
+    scale = min(1.0, max_side / max(image.size))
+    recorded = image.info.get("dpi")
+    if recorded and recorded[0] and float(recorded[0]) > dpi:
+        scale = min(scale, dpi / float(recorded[0]))
+    return scale
+
+def _encode(image, quality: int) -> tuple[bytes, str]:
+    """Smallest of JPEG (photos) and PNG (scans, screenshots) as (data, extension)"""
+    encoded = []
+    for fmt, extension, options in (("JPEG", ".jpg", {"quality": quality, "optimize": True}),
+                                    ("PNG", ".png", {"optimize": True})):
+        buffer = io.BytesIO()
+        image.save(buffer, fmt, **options)
+        encoded.append((buffer.getvalue(), extension))
+    return min(encoded, key=lambda item: len(item[0]))
+
+def prepare_image(path: str, directory: str, dpi: int = OCR_IMAGE_DPI, max_side: int = OCR_IMAGE_MAX_SIDE,
+                  quality: int = OCR_IMAGE_JPEG_QUALITY) -> dict:
+    """Write OCR-ready page images of path into directory.
+
+    Returns {"pages": [paths], "original_bytes", "bytes", "bytes_saved"}. A single-frame image
+    that would not get smaller and needs no rotation is passed through as is.
+    """
+    from PIL import Image, ImageOps, ImageSequence
+
+    original_bytes = os.path.getsize(path)
+    with span("image_prep", backend="pillow", input_bytes=original_bytes) as attrs, Image.open(path) as source:
+        frames = []
+        for frame in ImageSequence.Iterator(source):
+            rotated = frame.getexif().get(0x0112, 1) != 1     # EXIF orientation tag
+            image = ImageOps.exif_transpose(frame).convert("L")
+            scale = _scale(frame, dpi, max_side)
+            if scale < 1:
+                image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                     Image.LANCZOS)
+            frames.append((_encode(image, quality), rotated))
+
+        if len(frames) == 1 and not frames[0][1] and len(frames[0][0][0]) >= original_bytes:
+            pages, size = [path], original_bytes
+        else:
+            pages, size = [], 0
+            for i, ((data, extension), _) in enumerate(frames):
+                page_path = os.path.join(directory, f"page_{i + 1}{extension}")
+                with open(page_path, "wb") as f:
+                    f.write(data)
+                pages.append(page_path)
+                size += len(data)
+        attrs["pages"] = len(pages)
+        attrs["bytes_saved"] = original_bytes - size
+
+    print(f"[🖼️] Prepared {len(pages)} page(s) for OCR: {original_bytes / 1e6:.1f} MB -> {size / 1e6:.1f} MB "
+          f"({(original_bytes - size) / original_bytes:.0%} smaller)")
+    return {"pages": pages, "original_bytes": original_bytes, "bytes": size, "bytes_saved": original_bytes - size}
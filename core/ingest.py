@@ -0,0 +1,66 @@
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from .config import UPLOAD_DIR, UPLOAD_CHUNK_BYTES, UPLOAD_TTL_SECONDS
+
+# ==== Upload Ingestion ====
+# Uploads are streamed to a private temp file in fixed-size chunks and hashed in the same pass,
+# so peak memory stays flat and the file hash doubles as the extraction cache key.
+
+def discard_upload(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def sweep_uploads(directory: str = UPLOAD_DIR, max_age: float = UPLOAD_TTL_SECONDS):
+    """Delete uploads left behind by crashed or killed workers"""
+    cutoff = time.time() - max_age
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                discard_upload(path)
+        except FileNotFoundError:
+            pass
+
+def ingest_upload(stream, suffix: str = "", directory: str = UPLOAD_DIR,
+                  chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> dict:
+    """Copy a binary stream to a temp file chunk by chunk; returns path, sha256 and size.
+
+    The caller owns the file; release it with discard_upload(path) or use ingested_upload().
+    """
+    sweep_uploads(directory)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(stream, "seek"):
+                stream.seek(0)
+            for block in iter(lambda: stream.read(chunk_bytes), b""):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+    except BaseException:
+        discard_upload(path)
+        raise
+    print(f"[✔] Ingested upload: {size:,} bytes")
+    return {"path": path, "sha256": digest.hexdigest(), "size": size}
+
+@contextmanager
+def ingested_upload(stream, suffix: str = ""):
+    """ingest_upload() whose temp file is removed when the block exits, even on error"""
+    upload = ingest_upload(stream, suffix)
+    try:
+        yield upload
+    finally:
+        discard_upload(upload["path"])
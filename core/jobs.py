@@ -0,0 +1,184 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .answer_cache import content_hash, get_answer_cache
+from .clients import with_request_session
+from .compaction import compact_text
+from .config import JOB_WORKERS, JOB_TTL_SECONDS, COMPACT_EXTRACTED_TEXT
+from .extraction import extract_document
+from .ingest import ingested_upload
+from .reorganize import (plan_reorganize, reorganize_markdown_stream, reorganize_sections, cached_reorganization,
+                         remember_reorganization)
+from .qa import rag_batch
+from .retrieval import build_index
+from .tables import build_table_index
+
+# ==== Background Jobs ====
+# Long-running work (extraction, reorganization) runs on a process-wide worker pool, so a
+# Streamlit rerun does not discard it; the UI polls the job by id for status and progress.
+
+class Job:
+    """A submitted unit of work with live progress.
+
+    The job function receives the Job and reports through job.update(done, total, message)
+    and job.append(text) for partial output.
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"          # queued -> running -> done | error
+        self.done = 0
+        self.total = 0
+        self.message = "Queued"
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, done: int = None, total: int = None, message: str = None):
+        with self._lock:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message
+
+    def append(self, text: str):
+        with self._lock:
+            self.partial += text
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    @property
+    def finished_ok(self) -> bool:
+        return self.status == "done"
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+def _run(job: Job, fn, args, kwargs):
+    job.status = "running"
+    job.update(message="Running")
+    try:
+        job.result = fn(job, *args, **kwargs)
+        job.status = "done"
+        job.update(done=job.total or 1, total=job.total or 1, message="Done")
+    except Exception as e:
+        print(f"[❌] Job {job.kind} {job.id[:8]} failed: {e}")
+        job.error = f"{e.__class__.__name__}: {e}"
+        job.status = "error"
+    finally:
+        job.finished = time.time()
+
+def _expire():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _lock:
+        for job_id in [i for i, job in _jobs.items() if job.finished and job.finished < cutoff]:
+            del _jobs[job_id]
+
+def submit_job(kind: str, fn, *args, **kwargs) -> Job:
+    """Run fn(job, *args, **kwargs) on the worker pool, under the caller's request session, and return its Job"""
+    _expire()
+    job = Job(kind)
+    with _lock:
+        _jobs[job.id] = job
+    _get_executor().submit(with_request_session(_run), job, fn, args, kwargs)
+    return job
+
+def discard_job(job_id: str):
+    """Forget a job whose result has been consumed, so it is not held until the TTL expires"""
+    with _lock:
+        _jobs.pop(job_id, None)
+
+def get_job(job_id: str | None) -> Job | None:
+    if job_id is None:
+        return None
+    with _lock:
+        return _jobs.get(job_id)
+
+# ==== Pipeline Jobs ====
+
+def extraction_job(job: Job, source, suffix: str = "") -> dict:
+    """Extract and index a file path or binary stream (e.g. an upload).
+
+    Streams are ingested to a temp file that is removed as soon as extraction ends. The text is
+    compacted (see compact_text(); its report, the extracted text and the offset map back to it
+    are under "compaction"). Returns the extraction dict
+    plus index and content_hash.
+    """
+    if isinstance(source, str):
+        extraction = extract_document(source, on_progress=job.update)
+        file_hash = None
+    else:
+        job.update(message="Receiving upload")
+        with ingested_upload(source, suffix) as upload:
+            extraction = extract_document(upload["path"], on_progress=job.update, file_hash=upload["sha256"])
+        file_hash = upload["sha256"]
+    if COMPACT_EXTRACTED_TEXT and extraction["text"]:
+        job.update(message="Compacting content")
+        compaction = compact_text(extraction["text"])
+        extraction = {**extraction, "text": compaction.pop("text"), "tokens": compaction["tokens"],
+                      "compaction": compaction}
+    text = extraction["text"]
+    job.update(message="Indexing content")
+    return {**extraction, "index": build_index(text), "tables": build_table_index(text),
+            "content_hash": content_hash(text), "file_hash": file_hash or content_hash(text)}
+
+def reorganize_job(job: Job, raw: str) -> dict:
+    """Reorganize and index text; partial output is available on job.partial as it arrives"""
+    map_reduce = plan_reorganize(raw)["strategy"] == "map_reduce"
+    cached = None if map_reduce else cached_reorganization(raw)
+    if map_reduce:
+        for section in reorganize_sections(raw, on_progress=job.update):
+            job.append(f"{section}\n\n")
+        organized = job.partial
+    elif cached is not None:
+        print("[⚡] Reorganization cache hit.")
+        job.append(cached)
+        organized = job.partial
+        job.update(1, 1)
+    else:
+        job.update(0, 1, "Reorganizing content")
+        for delta in reorganize_markdown_stream(raw):
+            job.append(delta)
+        organized = job.partial
+        remember_reorganization(raw, organized)
+        job.update(1, 1)
+    job.update(message="Indexing reorganized content")
+    return {"text": organized, "index": build_index(organized), "tables": build_table_index(organized),
+            "content_hash": content_hash(organized)}
+
+def prefetch_job(job: Job, con: str, questions: list[str], doc_hash: str, index=None, tables=None) -> list[dict]:
+    """Answer questions ahead of time into the answer cache, so they display instantly when asked"""
+    cache = get_answer_cache()
+    pending = [q for q in questions if not cache.contains(doc_hash, q)]
+    job.update(len(questions) - len(pending), len(questions), "Prefetching answers")
+    if not pending:
+        return []
+
+    def store(i: int, result: dict):
+        if not result["error"]:
+            cache.put(doc_hash, result["question"], result["answer"], result["chart_data"])
+        job.update(job.done + 1)
+
+    return rag_batch(con, pending, index=index, tables=tables, on_result=store)
@@ -0,0 +1,226 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .answer_cache import content_hash
+from .clients import openai_client, call_with_retry, concurrency_slot, with_request_session
+from .config import LLM_MODEL, RAG_TOP_K, RAG_TOKEN_BUDGET, RAG_SESSION_MAX_TURNS, RAG_OUTPUT_TOKENS, RAG_BATCH_WORKERS
+from .retrieval import DocumentIndex, retrieve_context
+from .store import get_document_store
+from .tables import TableIndex, answer_from_tables
+from .tokens import count_tokens, plan_request, truncate_to_tokens
+from .telemetry import span
+from .usage import record_usage
+
+# ==== RAG ====
+
+CHART_START = "[CHART_DATA]"
+CHART_END = "[/CHART_DATA]"
+
+# Static instructions come first and the document follows, so every request on the same
+# document shares a byte-identical prefix the provider can serve from its prompt cache.
+RAG_INSTRUCTIONS = """You are an assistant that answers questions from provided content.
+
+If the user asks for charts, graphs, or visualizations:
+1. First provide a text answer
+2. Then provide data in JSON format for visualization
+3. Use this format: [CHART_DATA]{json_data}[/CHART_DATA]
+
+For pie charts, use: {"type": "pie", "labels": ["label1", "label2"], "values": [value1, value2], "title": "Chart Title"}
+For bar charts, use: {"type": "bar", "x": ["item1", "item2"], "y": [value1, value2], "title": "Chart Title"}
+For line charts, use: {"type": "line", "x": ["point1", "point2"], "y": [value1, value2], "title": "Chart Title"}"""
+
+def rag_system_prompt(con: str) -> str:
+    """Instructions followed by the content; deterministic for a given content"""
+    return f"{RAG_INSTRUCTIONS}\n\nAnswer from the following content:\n{con}"
+
+def plan_rag(con: str, question: str = "", index: DocumentIndex = None) -> dict:
+    """Budget plan for answering from the full content ("chunk" when an index can be used instead)"""
+    prompt_tokens = count_tokens(RAG_INSTRUCTIONS) + (count_tokens(question) if question else 0)
+    return plan_request(count_tokens(con), prompt_tokens, RAG_OUTPUT_TOKENS, can_chunk=index is not None)
+
+def _rag_messages(con: str, question: str, index: DocumentIndex = None, top_k: int = RAG_TOP_K,
+                  token_budget: int = RAG_TOKEN_BUDGET) -> list[dict]:
+    if index is not None:
+        con = retrieve_context(index, question, top_k=top_k, token_budget=token_budget)
+    else:
+        plan = plan_rag(con, question)
+        if plan["strategy"] == "truncate":
+            print(f"[⚠️] Content exceeds the context window, truncating to {plan['max_content_tokens']} tokens")
+            con = truncate_to_tokens(con, plan["max_content_tokens"])
+
+    return [
+        {"role": "system", "content": rag_system_prompt(con)},
+        {"role": "user", "content": question}
+    ]
+
+def _cache_key(messages: list[dict]) -> str:
+    """Route requests sharing a system prefix to the same provider cache"""
+    return content_hash(messages[0]["content"])[:32]
+
+def extract_chart_data(response: str) -> tuple[str, dict]:
+    """Split a model response into answer text and parsed [CHART_DATA] JSON"""
+    chart_data = None
+    if CHART_START in response and CHART_END in response:
+        try:
+            chart_start = response.find(CHART_START) + len(CHART_START)
+            chart_end = response.find(CHART_END)
+            chart_json = response[chart_start:chart_end]
+            chart_data = json.loads(chart_json)
+            # Remove chart data from response text
+            response = response.replace(f"{CHART_START}{chart_json}{CHART_END}", "").strip()
+        except:
+            chart_data = None
+    return response, chart_data
+
+def _message_bytes(messages: list[dict]) -> int:
+    return sum(len(message["content"].encode("utf-8")) for message in messages)
+
+def _complete(messages: list[dict]) -> str:
+    client = openai_client()
+    with span("rag", backend="openai", input_bytes=_message_bytes(messages)):
+        completion = call_with_retry(
+            client.chat.completions.create,
+            model=LLM_MODEL,
+            messages=messages,
+            prompt_cache_key=_cache_key(messages)
+        )
+        record_usage("rag", completion.usage)
+    return completion.choices[0].message.content
+
+def rag(con: str, question: str, index: DocumentIndex = None, top_k: int = RAG_TOP_K,
+        token_budget: int = RAG_TOKEN_BUDGET) -> tuple[str, dict]:
+    """Answer questions from provided content and detect visualization requests.
+
+    When an index is given, only the top-k relevant chunks are sent instead of the whole content.
+    """
+    return extract_chart_data(_complete(_rag_messages(con, question, index, top_k, token_budget)))
+
+def rag_batch(con: str, questions: list[str], index: DocumentIndex = None, tables: TableIndex = None,
+              max_workers: int = RAG_BATCH_WORKERS, on_result=None) -> list[dict]:
+    """Answer several questions about one document concurrently, returning results in question order.
+
+    Each result is a dict with question, answer, chart_data and error; a failed question does not
+    cancel the others. Chart questions are computed from tables first when given. on_result(i, result)
+    is called as each question finishes.
+    """
+    def answer(question: str) -> dict:
+        try:
+            computed = answer_from_tables(question, tables) if tables else None
+            text, chart_data = computed or rag(con, question, index=index)
+            return {"question": question, "answer": text, "chart_data": chart_data, "error": None}
+        except Exception as e:
+            print(f"[❌] Batch question failed: {e}")
+            return {"question": question, "answer": None, "chart_data": None, "error": f"{e.__class__.__name__}: {e}"}
+
+    results = [None] * len(questions)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(questions)))) as executor:
+        futures = {executor.submit(with_request_session(answer), question): i for i, question in enumerate(questions)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if on_result:
+                on_result(i, results[i])
+    return results
+
+def rag_documents(question: str, owner: str, doc_ids: list[str], top_k: int = RAG_TOP_K,
+                  token_budget: int = RAG_TOKEN_BUDGET) -> tuple[str, dict]:
+    """rag() over several of an owner's stored documents at once, retrieving from their combined index"""
+    index = get_document_store().combined_index(owner, doc_ids)
+    return rag("", question, index=index, top_k=top_k, token_budget=token_budget)
+
+class RagStream:
+    """Streaming rag(): iterate for visible text deltas, then read answer and chart_data.
+
+    Text from [CHART_DATA] onwards is held back from the visible stream and parsed once
+    the completion ends. Pass messages directly to stream a prepared conversation.
+    """
+
+    def __init__(self, con: str = None, question: str = None, index: DocumentIndex = None, top_k: int = RAG_TOP_K,
+                 token_budget: int = RAG_TOKEN_BUDGET, messages: list[dict] = None, on_complete=None):
+        self.messages = messages or _rag_messages(con, question, index, top_k, token_budget)
+        self.on_complete = on_complete
+        self.answer = None
+        self.chart_data = None
+        self.usage = None
+
+    def _deltas(self):
+        client = openai_client()
+        with span("rag", backend="openai", input_bytes=_message_bytes(self.messages), stream=True), \
+                concurrency_slot("openai", messages=self.messages):
+            stream = call_with_retry(
+                client.chat.completions.create,
+                acquire=False,
+                model=LLM_MODEL,
+                messages=self.messages,
+                prompt_cache_key=_cache_key(self.messages),
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if chunk.usage is not None:
+                    self.usage = record_usage("rag", chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def __iter__(self):
+        full = ""
+        shown = 0
+        for delta in self._deltas():
+            full += delta
+            marker = full.find(CHART_START)
+            if marker != -1:
+                visible_end = marker
+            else:
+                # Hold back a tail that could be the start of a split marker
+                visible_end = len(full)
+                for size in range(min(len(CHART_START) - 1, len(full)), 0, -1):
+                    if CHART_START.startswith(full[-size:]):
+                        visible_end = len(full) - size
+                        break
+            if visible_end > shown:
+                yield full[shown:visible_end]
+                shown = visible_end
+
+        self.answer, self.chart_data = extract_chart_data(full)
+        if self.on_complete:
+            self.on_complete(self.answer)
+        if self.chart_data is not None:
+            # Text the model wrote after the chart block is part of the answer too
+            tail = full[full.find(CHART_END) + len(CHART_END):].rstrip()
+            if tail.strip():
+                yield tail
+        elif shown < len(full):
+            yield full[shown:]      # no marker, or a chart block that did not parse
+
+class RagSession:
+    """Multi-turn Q&A over one document that reuses the same cached prompt prefix.
+
+    Every request starts with the identical system message (instructions + full content),
+    followed by the last max_turns exchanges and the new question. Only the turns are kept;
+    the content is passed with each question, so a session holds no copy of the document.
+    """
+
+    def __init__(self, max_turns: int = RAG_SESSION_MAX_TURNS):
+        self.max_turns = max_turns
+        self.turns = []
+
+    def messages(self, con: str, question: str) -> list[dict]:
+        messages = [{"role": "system", "content": rag_system_prompt(con)}]
+        for asked, answered in self.turns[-self.max_turns:]:
+            messages.append({"role": "user", "content": asked})
+            messages.append({"role": "assistant", "content": answered})
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def record(self, question: str, answer: str):
+        self.turns.append((question, answer))
+        del self.turns[:-self.max_turns]
+
+    def ask(self, con: str, question: str) -> tuple[str, dict]:
+        answer, chart_data = extract_chart_data(_complete(self.messages(con, question)))
+        self.record(question, answer)
+        return answer, chart_data
+
+    def stream(self, con: str, question: str) -> RagStream:
+        return RagStream(messages=self.messages(con, question),
+                         on_complete=lambda answer: self.record(question, answer))
@@ -0,0 +1,208 @@
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .clients import openai_client, call_with_retry, concurrency_slot, with_request_session
+from .config import LLM_MODEL, REORGANIZE_SECTION_TOKENS, REORGANIZE_WORKERS
+from .retrieval import HEADING_RE
+from .sections import get_section_cache, section_key
+from .tokens import get_encoder, count_tokens, plan_request
+from .telemetry import span
+from .usage import record_usage
+
+# ==== Reorganization ====
+
+REORGANIZE_PROMPT = (
+    "You are a reorganizer. Return the content in Markdown, keeping it identical. "
+    "Do not delete or replace anything—only reorganize for better structure. your response the content direct without (``` ```)."
+)
+
+def _reorganize_messages(raw: str) -> list[dict]:
+    return [
+        {"role": "system", "content": REORGANIZE_PROMPT},
+        {"role": "user", "content": f"reorganize the following content:\n {raw}"}
+    ]
+
+def plan_reorganize(raw: str) -> dict:
+    """Budget plan for reorganizing raw; the output is expected to be as long as the input.
+
+    Map-reduce is chosen when one request would not fit, and also for anything above
+    REORGANIZE_SECTION_TOKENS so large documents are processed in parallel.
+    """
+    content_tokens = count_tokens(raw)
+    plan = plan_request(content_tokens, count_tokens(REORGANIZE_PROMPT), content_tokens, can_map_reduce=True)
+    if plan["strategy"] == "direct" and content_tokens > REORGANIZE_SECTION_TOKENS:
+        plan["strategy"] = "map_reduce"
+    return plan
+
+def reorganize_markdown(raw: str) -> str:
+    """Reorganize markdown via OpenAI"""
+    client = openai_client()
+    with span("reorganize", backend="openai", input_bytes=len(raw.encode("utf-8"))):
+        completion = call_with_retry(
+            client.chat.completions.create,
+            model=LLM_MODEL,
+            messages=_reorganize_messages(raw)
+        )
+        record_usage("reorganize", completion.usage)
+    print("===Reorganized Done===")
+    return completion.choices[0].message.content
+
+def reorganize_markdown_stream(raw: str):
+    """Reorganize markdown via OpenAI, yielding text deltas as they arrive"""
+    client = openai_client()
+    messages = _reorganize_messages(raw)
+    with span("reorganize", backend="openai", input_bytes=len(raw.encode("utf-8")), stream=True), \
+            concurrency_slot("openai", messages=messages):
+        stream = call_with_retry(
+            client.chat.completions.create,
+            acquire=False,
+            model=LLM_MODEL,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                record_usage("reorganize", chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    print("===Reorganized Done===")
+
+PAGE_BREAK_RE = re.compile(r"^(\f|---+|<!--\s*page.*-->)\s*$", re.IGNORECASE)
+
+def _is_cut_point(piece: str) -> bool:
+    """About one piece in four ends a section, chosen by the piece's own content"""
+    return hashlib.sha1(piece.encode("utf-8")).digest()[0] % 4 == 0
+
+def split_structural_sections(raw: str, max_tokens: int = REORGANIZE_SECTION_TOKENS, enc=None) -> list[str]:
+    """Split text on headings and page breaks into sections of at most max_tokens.
+
+    Tables and fenced code blocks are never split across sections. Once a section holds half
+    its budget it ends at a content-defined cut point, so an edit only shifts the boundaries
+    up to the next unchanged cut point and the other sections of a revision hash the same.
+    """
+    enc = enc or get_encoder()
+
+    # Structural blocks: a new block starts at each heading or page break
+    blocks, current, in_fence = [], [], False
+    for line in raw.split("\n"):  # not splitlines(): keep form-feed page breaks as lines
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and current and (HEADING_RE.match(line) or PAGE_BREAK_RE.match(line)):
+            blocks.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+
+    # Oversized blocks fall back to paragraph boundaries outside tables/fences
+    pieces = []
+    for block in blocks:
+        if len(enc.encode(block)) <= max_tokens:
+            pieces.append(block)
+            continue
+        para, in_fence = [], False
+        for line in block.split("\n"):
+            if line.lstrip().startswith("```"):
+                in_fence = not in_fence
+            para.append(line)
+            if not line.strip() and not in_fence:
+                pieces.append("\n".join(para))
+                para = []
+        if para:
+            pieces.append("\n".join(para))
+
+    # Pack pieces back up to the section budget, ending early at content-defined cut points
+    sections, current, current_tokens = [], [], 0
+    for piece in pieces:
+        piece_tokens = len(enc.encode(piece))
+        if current and current_tokens + piece_tokens > max_tokens:
+            sections.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+        if current_tokens >= max_tokens // 2 and _is_cut_point(piece):
+            sections.append("\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        sections.append("\n".join(current))
+    return [section for section in sections if section.strip()]
+
+def _top_heading_level(text: str) -> int | None:
+    levels = [len(m.group(1)) for m in map(HEADING_RE.match, text.splitlines()) if m]
+    return min(levels) if levels else None
+
+def align_heading_levels(original: str, reorganized: str) -> str:
+    """Shift headings in a reorganized section so its top level matches the original section"""
+    target = _top_heading_level(original)
+    current = _top_heading_level(reorganized)
+    if target is None or current is None or target == current:
+        return reorganized
+    shift = target - current
+    lines = []
+    in_fence = False
+    for line in reorganized.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line)
+        if match:
+            level = min(6, max(1, len(match.group(1)) + shift))
+            line = f"{'#' * level} {match.group(2)}"
+        lines.append(line)
+    return "\n".join(lines)
+
+def reorganization_key(raw: str) -> str:
+    """Section cache key of the reorganization of raw by the current model and prompt"""
+    return section_key("reorganize", LLM_MODEL, REORGANIZE_PROMPT, raw)
+
+def cached_reorganization(raw: str) -> str | None:
+    cache = get_section_cache()
+    key = reorganization_key(raw)
+    return cache.get_organized([key]).get(key) if cache else None
+
+def remember_reorganization(raw: str, organized: str):
+    cache = get_section_cache()
+    if cache and organized:
+        cache.put_organized(reorganization_key(raw), organized)
+
+def reorganize_sections(raw: str, max_workers: int = REORGANIZE_WORKERS,
+                        max_tokens: int = REORGANIZE_SECTION_TOKENS, on_progress=None):
+    """Reorganize structural sections concurrently, yielding results in document order.
+
+    Sections reorganized before (by any document version) come from the section cache, so a
+    revision only sends its changed sections. on_progress(done, total, message) is called as
+    each section finishes, when given.
+    """
+    sections = split_structural_sections(raw, max_tokens=max_tokens)
+    cache = get_section_cache()
+    keys = [reorganization_key(section) for section in sections]
+    cached = cache.get_organized(keys) if cache else {}
+    changed = sum(key not in cached for key in keys)
+    if cached:
+        print(f"[⚡] Reusing {len(sections) - changed} of {len(sections)} reorganized sections.")
+    print(f"[🔀] Reorganizing {changed} sections with {max_workers} workers...")
+    finished = [len(sections) - changed]
+    lock = threading.Lock()
+    if on_progress:
+        on_progress(finished[0], len(sections), f"Reorganizing {changed} of {len(sections)} sections")
+
+    def reorganize_section(section: str, key: str) -> str:
+        if key in cached:
+            return cached[key]
+        organized = align_heading_levels(section, reorganize_markdown(section))
+        remember_reorganization(section, organized)
+        if on_progress:
+            with lock:
+                finished[0] += 1
+                on_progress(finished[0], len(sections), f"Reorganized {finished[0]} of {len(sections)} sections")
+        return organized
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(with_request_session(reorganize_section), sections, keys)
+
+def reorganize_markdown_parallel(raw: str, max_workers: int = REORGANIZE_WORKERS,
+                                 max_tokens: int = REORGANIZE_SECTION_TOKENS) -> str:
+    """Map-reduce reorganization for documents larger than a single request"""
+    return "\n\n".join(reorganize_sections(raw, max_workers=max_workers, max_tokens=max_tokens))
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import re
+import math
+from collections import Counter
+
+from .clients import openai_client, call_with_retry
+from .config import EMBEDDING_MODEL, CHUNK_MAX_TOKENS, RAG_TOP_K, RAG_TOKEN_BUDGET, HYBRID_ALPHA
+from .sections import get_section_cache, section_key
+from .telemetry import span
+from .tokens import get_encoder
+
+# ==== Retrieval Index ====
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _split_sections(text: str) -> list[tuple[str, str]]:
+    """Split markdown into (heading path, body) sections"""
+    sections = []
+    path = []
+    buffer = []
+
+    def flush():
+        body = "\n".join(buffer).strip()
+        if body:
+            sections.append((" > ".join(title for _, title in path), body))
+        buffer.clear()
+
+    for line in text.splitlines():
+        match = HEADING_RE.match(line)
+        if match:
+            flush()
+            level = len(match.group(1))
+            path = [(lvl, title) for lvl, title in path if lvl < level]
+            path.append((level, match.group(2).strip()))
+        buffer.append(line)
+    flush()
+    return sections
+
+def chunk_markdown(text: str, max_tokens: int = CHUNK_MAX_TOKENS, enc=None) -> list[dict]:
+    """Split markdown into heading-aware chunks of at most max_tokens"""
+    enc = enc or get_encoder()
+    chunks = []
+
+    def emit(heading, body):
+        chunks.append({"heading": heading, "text": body, "tokens": len(enc.encode(body))})
+
+    for heading, body in _split_sections(text):
+        if len(enc.encode(body)) <= max_tokens:
+            emit(heading, body)
+            continue
+
+        # Oversized section: pack paragraphs, hard-split anything still too long
+        current, current_tokens = [], 0
+        for para in re.split(r"\n\s*\n", body):
+            para_tokens = enc.encode(para)
+            if len(para_tokens) > max_tokens:
+                if current:
+                    emit(heading, "\n\n".join(current))
+                    current, current_tokens = [], 0
+                for start in range(0, len(para_tokens), max_tokens):
+                    emit(heading, enc.decode(para_tokens[start:start + max_tokens]))
+                continue
+            if current_tokens + len(para_tokens) > max_tokens and current:
+                emit(heading, "\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(para)
+            current_tokens += len(para_tokens)
+        if current:
+            emit(heading, "\n\n".join(current))
+
+    return chunks
+
+def _tokenize(text: str) -> list[str]:
+    return WORD_RE.findall(text.lower())
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """Embed texts via OpenAI, returned as L2-normalized rows"""
+    import numpy as np
+    client = openai_client()
+    vectors = []
+    for start in range(0, len(texts), 256):
+        batch = texts[start:start + 256]
+        with span("embedding", backend="openai", input_bytes=sum(len(t.encode("utf-8")) for t in batch)):
+            response = call_with_retry(client.embeddings.create, model=EMBEDDING_MODEL, input=batch)
+        vectors.extend(item.embedding for item in response.data)
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def embed_texts_cached(texts: list[str]) -> np.ndarray:
+    """embed_texts() that only sends texts not embedded before; the rest come from the section cache"""
+    import numpy as np
+    cache = get_section_cache()
+    if cache is None:
+        return embed_texts(texts)
+    keys = [section_key("embedding", EMBEDDING_MODEL, text) for text in texts]
+    vectors = cache.get_embeddings(list(set(keys)))
+    missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+    if missing:
+        fresh = dict(zip(missing, embed_texts(list(missing.values()))))
+        cache.put_embeddings(fresh)
+        vectors.update(fresh)
+    if len(missing) < len(set(keys)):
+        print(f"[⚡] Reused {len(set(keys)) - len(missing)} of {len(set(keys))} chunk embeddings.")
+    return np.vstack([vectors[key] for key in keys])
+
+class DocumentIndex:
+    """Hybrid BM25 + embedding index over the chunks of one document"""
+
+    def __init__(self, chunks: list[dict], embeddings: np.ndarray = None, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(_tokenize(f"{c['heading']}\n{c['text']}")) for c in chunks]
+        self.doc_lens = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_len = (sum(self.doc_lens) / len(self.doc_lens)) if chunks else 0.0
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    @property
+    def total_tokens(self) -> int:
+        """Document size from the per-chunk counts taken at indexing time"""
+        return sum(chunk["tokens"] for chunk in self.chunks)
+
+    def bm25_scores(self, question: str) -> np.ndarray:
+        import numpy as np
+        terms = _tokenize(question)
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lens[i] / (self.avg_len or 1))
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    scores[i] += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+        return scores
+
+    def search(self, question: str, top_k: int = RAG_TOP_K, token_budget: int = RAG_TOKEN_BUDGET,
+               alpha: float = HYBRID_ALPHA) -> list[dict]:
+        """Return the best chunks for the question, in document order, within the token budget"""
+        import numpy as np
+        if not self.chunks:
+            return []
+
+        scores = self.bm25_scores(question)
+        if scores.max() > 0:
+            scores = scores / scores.max()
+        if self.embeddings is not None:
+            try:
+                query = embed_texts([question])[0]
+                scores = alpha * scores + (1 - alpha) * np.clip(self.embeddings @ query, 0, None)
+            except Exception as e:
+                print(f"[⚠️] Query embedding failed, using BM25 only: {e}")
+
+        selected, used = [], 0
+        for i in np.argsort(-scores, kind="stable"):
+            if len(selected) >= top_k:
+                break
+            if used + self.chunks[i]["tokens"] > token_budget:
+                continue
+            selected.append(int(i))
+            used += self.chunks[i]["tokens"]
+        return [self.chunks[i] for i in sorted(selected)]
+
+def build_index(text: str) -> DocumentIndex:
+    """Chunk and index extracted content once, so questions only send the relevant parts"""
+    chunks = chunk_markdown(text)
+    embeddings = None
+    if chunks:
+        try:
+            embeddings = embed_texts_cached([f"{c['heading']}\n{c['text']}" for c in chunks])
+        except Exception as e:
+            print(f"[⚠️] Embedding failed, index will use BM25 only: {e}")
+    print(f"[✔] Indexed {len(chunks)} chunks.")
+    return DocumentIndex(chunks, embeddings)
+
+def retrieve_context(index: DocumentIndex, question: str, top_k: int = RAG_TOP_K,
+                     token_budget: int = RAG_TOKEN_BUDGET) -> str:
+    """Join the top-k chunks for a question into a prompt-ready context"""
+    parts = []
+    for chunk in index.search(question, top_k=top_k, token_budget=token_budget):
+        parts.append(f"[Section: {chunk['heading']}]\n{chunk['text']}" if chunk["heading"] else chunk["text"])
+    return "\n\n---\n\n".join(parts)
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .config import STORE_DIR, SECTION_CACHE_MAX_ENTRIES
+
+# ==== Section Cache ====
+# Reorganized sections and chunk embeddings are keyed by a hash of their exact input, so a revised
+# upload of a document only sends the sections and chunks that changed; unchanged ones are read
+# back whichever earlier version (or other document) produced them.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS organized (key TEXT PRIMARY KEY, text TEXT NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS organized_used ON organized (used);
+CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used);
+"""
+
+def section_key(*parts: str) -> str:
+    """SHA-256 over the model/prompt/text parts that determine a cached result"""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+class SectionCache:
+    """Process-wide SQLite cache shared by every session on the host (see get_section_cache())"""
+
+    def __init__(self, path: str = os.path.join(STORE_DIR, "sections.db"),
+                 max_entries: int = SECTION_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def _get(self, table: str, column: str, keys: list[str]) -> dict:
+        found = {}
+        with self._lock, self._db:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                marks = ", ".join("?" * len(batch))
+                found.update(self._db.execute(f"SELECT key, {column} FROM {table} WHERE key IN ({marks})",
+                                              batch).fetchall())
+            if found:
+                now = time.time()
+                self._db.executemany(f"UPDATE {table} SET used = ? WHERE key = ?", [(now, key) for key in found])
+        return found
+
+    def _put(self, table: str, column: str, items: dict):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO {table} (key, {column}, used) VALUES (?, ?, ?)",
+                                 [(key, value, now) for key, value in items.items()])
+            # Least recently used entries beyond the limit are dropped
+            self._db.execute(f"DELETE FROM {table} WHERE key IN "
+                             f"(SELECT key FROM {table} ORDER BY used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def get_organized(self, keys: list[str]) -> dict[str, str]:
+        return self._get("organized", "text", keys)
+
+    def put_organized(self, key: str, text: str):
+        self._put("organized", "text", {key: text})
+
+    def get_embeddings(self, keys: list[str]) -> dict:
+        import numpy as np
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in self._get("embeddings", "vector", keys).items()}
+
+    def put_embeddings(self, vectors: dict):
+        import numpy as np
+        self._put("embeddings", "vector",
+                  {key: np.asarray(vector, dtype=np.float32).tobytes() for key, vector in vectors.items()})
+
+_section_cache = None
+_section_cache_lock = threading.Lock()
+
+def get_section_cache() -> SectionCache | None:
+    """The shared section cache, or None when its directory is not usable (nothing is reused then)"""
+    global _section_cache
+    with _section_cache_lock:
+        if _section_cache is None:
+            try:
+                _section_cache = SectionCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[⚠️] Section cache unavailable: {e}")
+                return None
+    return _section_cache
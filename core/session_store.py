@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+
+from .config import SESSION_STORE_DIR, SESSION_MEMORY_BUDGET, SESSION_TTL_SECONDS
+from .telemetry import register_gauge
+
+# ==== Session Blob Store ====
+# Large per-session values (document texts, indexes, tables, archived history) are written
+# compressed to disk and kept in memory only while they fit a process-wide budget; the least
+# recently used ones are dropped from memory first and read back from disk when next accessed.
+
+_MISSING = object()
+
+def _encode(value) -> tuple[bytes, int]:
+    """(compressed blob, in-memory size estimate) of a str or picklable value"""
+    if isinstance(value, str):
+        raw, tag, size = value.encode("utf-8"), b"s", sys.getsizeof(value)
+    else:
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        tag, size = b"p", len(raw)
+    return tag + zlib.compress(raw, 3), size
+
+def _decode(data: bytes) -> tuple:
+    """(value, in-memory size estimate) of a blob written by _encode()"""
+    raw = zlib.decompress(data[1:])
+    if data[:1] == b"s":
+        value = raw.decode("utf-8")
+        return value, sys.getsizeof(value)
+    return pickle.loads(raw), len(raw)
+
+class SessionStore:
+    """Process-wide spill-to-disk store of session values (see SessionBlobs for the per-session view)"""
+
+    def __init__(self, directory: str = SESSION_STORE_DIR, memory_budget: int = SESSION_MEMORY_BUDGET):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.loads = 0                      # values read back from disk after eviction
+        self._resident = OrderedDict()      # (session, name) -> (value, size), least recently used first
+        self._resident_bytes = 0
+        self._disk = {}                     # (session, name) -> compressed bytes on disk
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.sweep()
+
+    def _path(self, session: str, name: str) -> str:
+        return os.path.join(self.directory, session, f"{name}.z")
+
+    def _evict(self):
+        while self._resident_bytes > self.memory_budget and len(self._resident) > 1:
+            _, (_, size) = self._resident.popitem(last=False)
+            self._resident_bytes -= size
+
+    def _keep(self, key: tuple, value, size: int):
+        if key in self._resident:
+            self._resident_bytes -= self._resident.pop(key)[1]
+        self._resident[key] = (value, size)
+        self._resident_bytes += size
+        self._evict()
+
+    def put(self, session: str, name: str, value):
+        data, size = _encode(value)
+        path = self._path(session, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._disk[(session, name)] = len(data)
+            self._keep((session, name), value, size)
+
+    def get(self, session: str, name: str, default=None):
+        key = (session, name)
+        with self._lock:
+            if key in self._resident:
+                self._resident.move_to_end(key)
+                return self._resident[key][0]
+            if key not in self._disk:
+                return default
+        try:
+            with open(self._path(session, name), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return default
+        value, size = _decode(data)
+        with self._lock:
+            self.loads += 1
+            if key in self._disk:
+                self._keep(key, value, size)
+        return value
+
+    def contains(self, session: str, name: str) -> bool:
+        with self._lock:
+            return (session, name) in self._disk
+
+    def delete(self, session: str, name: str):
+        with self._lock:
+            self._disk.pop((session, name), None)
+            if (session, name) in self._resident:
+                self._resident_bytes -= self._resident.pop((session, name))[1]
+        for path in (self._path(session, name), self._archive_path(session, name)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    # ---- append-only archives (e.g. Q&A history beyond what is kept in memory) ----
+    def _archive_path(self, session: str, name: str) -> str:
+        return os.path.join(self.directory, session, f"{name}.jsonl.gz")
+
+    def archive(self, session: str, name: str, entries: list[dict]):
+        path = self._archive_path(session, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def read_archive(self, session: str, name: str) -> list[dict]:
+        try:
+            with gzip.open(self._archive_path(session, name), "rt", encoding="utf-8") as f:
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+
+    # ---- lifecycle ----
+    def drop_session(self, session: str):
+        """Forget every value of a session and delete its files"""
+        with self._lock:
+            for key in [key for key in self._disk if key[0] == session]:
+                del self._disk[key]
+            for key in [key for key in self._resident if key[0] == session]:
+                self._resident_bytes -= self._resident.pop(key)[1]
+        shutil.rmtree(os.path.join(self.directory, session), ignore_errors=True)
+
+    def sweep(self, max_age: float = SESSION_TTL_SECONDS):
+        """Delete session directories left behind by earlier processes"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            live = {session for session, _ in self._disk}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name not in live and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+    def usage(self) -> dict:
+        with self._lock:
+            return {"resident_bytes": self._resident_bytes, "resident_values": len(self._resident),
+                    "disk_bytes": sum(self._disk.values()), "values": len(self._disk),
+                    "sessions": len({session for session, _ in self._disk}),
+                    "memory_budget": self.memory_budget, "loads": self.loads}
+
+class SessionBlobs:
+    """Dict-like view of one session's values in the session store, kept in st.session_state.
+
+    Its values are deleted when the object is garbage-collected, i.e. when Streamlit drops the
+    session's state.
+    """
+
+    def __init__(self, store: SessionStore = None):
+        self.store = store or get_session_store()
+        self.id = uuid.uuid4().hex
+        weakref.finalize(self, self.store.drop_session, self.id)
+
+    def __getitem__(self, name: str):
+        value = self.store.get(self.id, name, _MISSING)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name: str, value):
+        self.store.put(self.id, name, value)
+
+    def __contains__(self, name: str) -> bool:
+        return self.store.contains(self.id, name)
+
+    def get(self, name: str, default=None):
+        return self.store.get(self.id, name, default)
+
+    def discard(self, name: str):
+        self.store.delete(self.id, name)
+
+    def archive(self, name: str, entries: list[dict]):
+        self.store.archive(self.id, name, entries)
+
+    def read_archive(self, name: str) -> list[dict]:
+        return self.store.read_archive(self.id, name)
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            _session_store = SessionStore()
+            register_gauge("session_store_bytes", "Session values held in memory and on disk",
+                           lambda: {"memory": _session_store.usage()["resident_bytes"],
+                                    "disk": _session_store.usage()["disk_bytes"]}, label="where")
+            register_gauge("session_store_sessions", "Sessions with values in the session store",
+                           lambda: _session_store.usage()["sessions"])
+    return _session_store
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .config import STORE_DIR
+from .retrieval import DocumentIndex
+
+# ==== Document Store ====
+# Extracted and reorganized text, chunks and Q&A history live in SQLite; chunk embeddings are
+# .npy files opened memory-mapped. Reopening a document needs no extraction, reorganization or
+# embedding calls, and its vectors are paged in from disk only when a question searches them.
+# Every document has an owner (a user or workspace); reads and deletes only see the caller's own.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL,
+    extractor TEXT,
+    tokens INTEGER,
+    raw_text TEXT NOT NULL,
+    organized_text TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    doc_id TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    heading TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (doc_id, variant, position)
+);
+CREATE TABLE IF NOT EXISTS qa (
+    doc_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    chart_data TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS qa_doc ON qa (doc_id);
+"""
+
+VARIANTS = ("raw", "organized")
+
+def workspace_owner(workspace: str) -> str:
+    """Owner of a shared workspace's documents (a signed-in user's are "user:<email>")"""
+    return f"workspace:{workspace}"
+
+def document_id(owner: str, file_hash: str) -> str:
+    """Id of an owner's copy of a file, so the same file uploaded by two owners is stored twice"""
+    return hashlib.sha256(f"{owner}\x00{file_hash}".encode()).hexdigest()
+
+class DocumentStore:
+    """Process-wide persistent store of processed documents (see get_document_store())"""
+
+    def __init__(self, directory: str = STORE_DIR):
+        self.directory = directory
+        self.vector_dir = os.path.join(directory, "vectors")
+        os.makedirs(self.vector_dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "store.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(documents)")}
+            if "owner" not in columns:
+                # Documents stored before owners existed stay hidden from everyone
+                self._db.execute("ALTER TABLE documents ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            self._db.execute("CREATE INDEX IF NOT EXISTS documents_owner ON documents (owner, updated)")
+
+    # ---- vectors ----
+    def _vector_path(self, doc_id: str, variant: str) -> str:
+        return os.path.join(self.vector_dir, f"{doc_id}_{variant}.npy")
+
+    def _save_vectors(self, doc_id: str, variant: str, embeddings):
+        import numpy as np
+        path = self._vector_path(doc_id, variant)
+        if embeddings is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.vector_dir, suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(embeddings, dtype=np.float32))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _load_vectors(self, doc_id: str, variant: str):
+        import numpy as np
+        path = self._vector_path(doc_id, variant)
+        return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+    # ---- writes ----
+    def _save_chunks(self, doc_id: str, variant: str, index: DocumentIndex | None):
+        self._db.execute("DELETE FROM chunks WHERE doc_id = ? AND variant = ?", (doc_id, variant))
+        if index is not None:
+            self._db.executemany(
+                "INSERT INTO chunks (doc_id, variant, position, heading, text, tokens) VALUES (?, ?, ?, ?, ?, ?)",
+                [(doc_id, variant, i, c["heading"], c["text"], c["tokens"]) for i, c in enumerate(index.chunks)])
+
+    def save_document(self, owner: str, doc_id: str, name: str, raw_text: str, index: DocumentIndex = None,
+                      extractor: str = None, tokens: int = None):
+        """Insert or refresh an owner's document (see document_id()); Q&A history is kept"""
+        now = time.time()
+        with self._lock, self._db:
+            previous = self._db.execute("SELECT raw_text FROM documents WHERE id = ?", (doc_id,)).fetchone()
+            self._db.execute(
+                "INSERT INTO documents (id, owner, name, extractor, tokens, raw_text, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name, "
+                "extractor = excluded.extractor, tokens = excluded.tokens, raw_text = excluded.raw_text, "
+                "updated = excluded.updated", (doc_id, owner, name, extractor, tokens, raw_text, now, now))
+            if previous is not None and previous["raw_text"] != raw_text:
+                # A new extraction invalidates the old reorganization
+                self._db.execute("UPDATE documents SET organized_text = NULL WHERE id = ?", (doc_id,))
+                self._save_chunks(doc_id, "organized", None)
+                self._save_vectors(doc_id, "organized", None)
+            self._save_chunks(doc_id, "raw", index)
+            self._save_vectors(doc_id, "raw", index.embeddings if index is not None else None)
+
+    def save_organized(self, doc_id: str, organized_text: str, index: DocumentIndex = None):
+        with self._lock, self._db:
+            self._db.execute("UPDATE documents SET organized_text = ?, updated = ? WHERE id = ?",
+                             (organized_text, time.time(), doc_id))
+            self._save_chunks(doc_id, "organized", index)
+            self._save_vectors(doc_id, "organized", index.embeddings if index is not None else None)
+
+    def add_qa(self, doc_id: str, entry: dict):
+        """Append a Q&A entry to a document's history (ignored once the document is deleted)"""
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO qa (doc_id, question, answer, chart_data, timestamp) "
+                             "SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM documents WHERE id = ?)",
+                             (doc_id, entry["question"], entry["answer"],
+                              json.dumps(entry["chart_data"]) if entry.get("chart_data") else None, entry["timestamp"],
+                              doc_id))
+
+    def clear_qa(self, doc_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM qa WHERE doc_id = ?", (doc_id,))
+
+    def delete_document(self, owner: str, doc_id: str):
+        with self._lock, self._db:
+            if self._db.execute("SELECT 1 FROM documents WHERE id = ? AND owner = ?", (doc_id, owner)).fetchone() is None:
+                return
+            for table, column in (("documents", "id"), ("chunks", "doc_id"), ("qa", "doc_id")):
+                self._db.execute(f"DELETE FROM {table} WHERE {column} = ?", (doc_id,))
+            for variant in VARIANTS:
+                self._save_vectors(doc_id, variant, None)
+
+    # ---- reads ----
+    def list_documents(self, owner: str) -> list[dict]:
+        """An owner's documents, most recently updated first (without their text)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, name, extractor, tokens, organized_text IS NOT NULL AS organized, updated "
+                "FROM documents WHERE owner = ? ORDER BY updated DESC", (owner,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_index(self, doc_id: str, variant: str = "raw") -> DocumentIndex | None:
+        with self._lock:
+            rows = self._db.execute("SELECT heading, text, tokens FROM chunks WHERE doc_id = ? AND variant = ? "
+                                    "ORDER BY position", (doc_id, variant)).fetchall()
+        if not rows:
+            return None
+        embeddings = self._load_vectors(doc_id, variant)
+        if embeddings is not None and len(embeddings) != len(rows):
+            print(f"[⚠️] Stored vectors for {doc_id} do not match its chunks, using BM25 only")
+            embeddings = None
+        return DocumentIndex([dict(row) for row in rows], embeddings)
+
+    def load_document(self, owner: str, doc_id: str) -> dict | None:
+        """Everything needed to reopen an owner's document: texts, current index and Q&A history"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM documents WHERE id = ? AND owner = ?", (doc_id, owner)).fetchone()
+            qa = self._db.execute("SELECT question, answer, chart_data, timestamp FROM qa WHERE doc_id = ? "
+                                  "ORDER BY rowid", (doc_id,)).fetchall()
+        if row is None:
+            return None
+        document = dict(row)
+        document["index"] = self.load_index(doc_id, "organized" if document["organized_text"] else "raw")
+        document["qa_history"] = [{**dict(entry), "chart_data": json.loads(entry["chart_data"]) if entry["chart_data"] else None}
+                                  for entry in qa]
+        return document
+
+    def combined_index(self, owner: str, doc_ids: list[str]) -> DocumentIndex:
+        """One index over several of an owner's documents; chunk headings are prefixed with the document name"""
+        import numpy as np
+        names = {doc["id"]: doc["name"] for doc in self.list_documents(owner)}
+        chunks, matrices, embedded = [], [], True
+        for doc_id in [doc_id for doc_id in doc_ids if doc_id in names]:
+            with self._lock:
+                row = self._db.execute("SELECT organized_text IS NOT NULL AS organized FROM documents WHERE id = ?",
+                                       (doc_id,)).fetchone()
+            index = self.load_index(doc_id, "organized" if row and row["organized"] else "raw")
+            if index is None:
+                continue
+            for chunk in index.chunks:
+                heading = f"{names[doc_id]} > {chunk['heading']}" if chunk["heading"] else names[doc_id]
+                chunks.append({**chunk, "heading": heading})
+            if index.embeddings is None:
+                embedded = False
+            else:
+                matrices.append(index.embeddings)
+        embeddings = np.vstack(matrices) if embedded and matrices else None
+        return DocumentIndex(chunks, embeddings)
+
+_document_store = None
+_document_store_lock = threading.Lock()
+
+def get_document_store() -> DocumentStore:
+    global _document_store
+    with _document_store_lock:
+        if _document_store is None:
+            _document_store = DocumentStore()
+    return _document_store
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import json
+import re
+
+from .clients import openai_client, call_with_retry
+from .config import CHART_PLANNER_MODEL
+from .retrieval import HEADING_RE, WORD_RE
+from .telemetry import span
+from .usage import record_usage
+
+# ==== Document Tables ====
+# Markdown tables are parsed into typed DataFrames once per document. Chart questions are then
+# answered by a small LLM call that only picks the table, columns and aggregation; the numbers
+# themselves are computed locally, so they cannot be made up.
+
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+CHART_WORDS = {"chart", "charts", "graph", "plot", "visualize", "visualise", "visualization", "trend", "trends"}
+AGGREGATIONS = ("sum", "mean", "max", "min", "count", "none")
+
+def _cells(line: str) -> list[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+def _numeric(series):
+    """Column as numbers when most cells parse (ignoring %, currency and thousands separators)"""
+    import pandas as pd
+
+    cleaned = series.astype(str).str.replace(r"[,\s$€£%]", "", regex=True).str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+    numbers = pd.to_numeric(cleaned, errors="coerce")
+    filled = series.astype(str).str.strip().ne("")
+    return numbers if filled.any() and numbers[filled].notna().mean() >= 0.8 else None
+
+def _frame(header: list[str], rows: list[list[str]]):
+    import pandas as pd
+
+    columns, seen = [], {}
+    for i, name in enumerate(header):
+        name = name or f"column_{i + 1}"
+        seen[name] = seen.get(name, 0) + 1
+        columns.append(name if seen[name] == 1 else f"{name}_{seen[name]}")
+    rows = [(row + [""] * len(columns))[:len(columns)] for row in rows]
+    frame = pd.DataFrame(rows, columns=columns)
+    for column in frame.columns:
+        numbers = _numeric(frame[column])
+        if numbers is not None:
+            frame[column] = numbers
+    return frame
+
+def parse_markdown_tables(text: str) -> list[dict]:
+    """Pipe tables in text as dicts with id, caption, heading, offset and a typed DataFrame"""
+    lines = text.split("\n")
+    tables, heading, in_fence, offset, i = [], "", False, 0, 0
+    offsets = []
+    for line in lines:
+        offsets.append(offset)
+        offset += len(line) + 1
+
+    while i < len(lines):
+        line = lines[i]
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and HEADING_RE.match(line):
+            heading = HEADING_RE.match(line).group(2).strip()
+        elif (not in_fence and "|" in line and i + 1 < len(lines) and TABLE_SEPARATOR_RE.match(lines[i + 1])
+              and len(_cells(line)) == len(_cells(lines[i + 1]))):
+            header = _cells(line)
+            end = i + 2
+            while end < len(lines) and "|" in lines[end] and lines[end].strip():
+                end += 1
+            rows = [_cells(row) for row in lines[i + 2:end]]
+            if rows and not any(header):
+                # Converters such as MarkItDown emit an empty header row and the real one as the first row
+                header, rows = rows[0], rows[1:]
+            if rows:
+                above = next((lines[j].strip() for j in range(i - 1, max(-1, i - 3), -1) if lines[j].strip()), "")
+                is_caption = above and len(above) <= 120 and not HEADING_RE.match(above) and "|" not in above
+                tables.append({"id": f"t{len(tables)}", "caption": above if is_caption else heading, "heading": heading,
+                               "offset": offsets[i], "frame": _frame(header, rows)})
+            i = end
+            continue
+        i += 1
+    return tables
+
+class TableIndex:
+    """Tables of one document, searchable by caption, heading and column names"""
+
+    def __init__(self, tables: list[dict]):
+        self.tables = tables
+        self._terms = [set(WORD_RE.findall(" ".join([t["caption"], t["heading"], *map(str, t["frame"].columns)]).lower()))
+                       for t in tables]
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def get(self, table_id: str) -> dict | None:
+        return next((t for t in self.tables if t["id"] == table_id), None)
+
+    def search(self, question: str, top_k: int = 8) -> list[dict]:
+        """Tables whose caption/header words overlap the question most (document order on ties)"""
+        words = set(WORD_RE.findall(question.lower()))
+        scored = sorted(range(len(self.tables)), key=lambda i: (-len(words & self._terms[i]), i))
+        return [self.tables[i] for i in scored[:top_k]]
+
+    def describe(self, tables: list[dict]) -> str:
+        """Compact schema listing for the planner prompt"""
+        lines = []
+        for table in tables:
+            frame = table["frame"]
+            columns = ", ".join(f"{name} ({'number' if frame[name].dtype.kind in 'if' else 'text'})"
+                                for name in frame.columns)
+            sample = "; ".join(str(v) for v in frame.iloc[:3, 0].tolist())
+            lines.append(f"{table['id']}: \"{table['caption']}\" | {len(frame)} rows | columns: {columns} | "
+                         f"first column sample: {sample}")
+        return "\n".join(lines)
+
+def build_table_index(text: str) -> TableIndex:
+    tables = parse_markdown_tables(text)
+    if tables:
+        print(f"[📊] Parsed {len(tables)} tables")
+    return TableIndex(tables)
+
+def is_chart_question(question: str) -> bool:
+    return bool(CHART_WORDS & set(WORD_RE.findall(question.lower())))
+
+# ==== Chart Planning ====
+
+CHART_PLANNER_PROMPT = """You are a table planner. Given a question and a list of tables, choose the data for a chart.
+Reply with JSON only: {"table": "<id or null>", "x": "<category column>", "y": "<numeric column or null>",
+"aggregation": "sum|mean|max|min|count|none", "chart": "bar|pie|line", "title": "<chart title>"}
+Use "none" when each x value appears once. Use "count" with y null to count rows per category.
+Use {"table": null} when no table can answer the question."""
+
+def plan_chart(question: str, tables: TableIndex) -> dict | None:
+    """Ask the model which table, columns and aggregation answer a chart question"""
+    candidates = tables.search(question)
+    messages = [
+        {"role": "system", "content": CHART_PLANNER_PROMPT},
+        {"role": "user", "content": f"Tables:\n{tables.describe(candidates)}\n\nQuestion: {question}"}
+    ]
+    client = openai_client()
+    with span("chart_plan", backend="openai", tables=len(candidates)):
+        completion = call_with_retry(
+            client.chat.completions.create,
+            model=CHART_PLANNER_MODEL,
+            messages=messages,
+            response_format={"type": "json_object"},
+            max_tokens=200
+        )
+        record_usage("chart_plan", completion.usage)
+    try:
+        plan = json.loads(completion.choices[0].message.content)
+    except (TypeError, json.JSONDecodeError):
+        print("[⚠️] Chart planner returned invalid JSON")
+        return None
+    return plan if isinstance(plan, dict) and plan.get("table") else None
+
+def compute_chart(plan: dict, tables: TableIndex) -> dict | None:
+    """Run the planned aggregation locally and return create_visualization() chart data.
+
+    Returns None (so the question falls back to rag()) for an aggregation it does not know, or
+    for "none" when x repeats, which would chart duplicate labels.
+    """
+    table = tables.get(plan.get("table"))
+    if table is None:
+        return None
+    frame = table["frame"]
+    x, y = plan.get("x"), plan.get("y")
+    aggregation = plan.get("aggregation") or "none"
+    if aggregation not in AGGREGATIONS:
+        print(f"[⚠️] Unsupported chart aggregation: {aggregation}")
+        return None
+    if x not in frame.columns or (y is not None and y not in frame.columns):
+        return None
+
+    with span("chart_compute", backend="pandas", rows=len(frame)):
+        if aggregation == "count" or y is None:
+            series = frame.groupby(x, sort=False).size()
+        elif frame[y].dtype.kind not in "if":
+            return None
+        elif aggregation == "none":
+            if frame[x].duplicated().any():
+                return None
+            series = frame.set_index(x)[y].dropna()
+        else:
+            series = frame.dropna(subset=[y]).groupby(x, sort=False)[y].agg(aggregation)
+
+    labels = [str(label) for label in series.index]
+    values = [round(float(value), 6) for value in series.values]
+    if not labels:
+        return None
+    chart = plan.get("chart") if plan.get("chart") in ("bar", "pie", "line") else "bar"
+    title = plan.get("title") or table["caption"] or "Chart"
+    if chart == "pie":
+        return {"type": "pie", "labels": labels, "values": values, "title": title}
+    return {"type": chart, "x": labels, "y": values, "title": title}
+
+def answer_from_tables(question: str, tables: TableIndex) -> tuple[str, dict] | None:
+    """Answer a chart question from the document's tables, or None to fall back to rag()"""
+    if not tables or not is_chart_question(question):
+        return None
+    try:
+        plan = plan_chart(question, tables)
+        chart_data = compute_chart(plan, tables) if plan else None
+    except Exception as e:
+        print(f"[⚠️] Table answer failed ({e}), falling back to RAG")
+        return None
+    if chart_data is None:
+        return None
+    table = tables.get(plan["table"])
+    measure = "row count" if plan.get("aggregation") == "count" or not plan.get("y") else \
+        (plan["y"] if plan.get("aggregation") in (None, "none") else f"{plan['aggregation']} of {plan['y']}")
+    answer = (f"Computed from the table \"{table['caption'] or table['id']}\": {measure} by {plan['x']} "
+              f"({len(chart_data.get('labels') or chart_data.get('x'))} values).")
+    return answer, chart_data
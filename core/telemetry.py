@@ -0,0 +1,190 @@
+import contextvars
+import json
+import threading
+import time
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+from .config import TRACE_LOG_PATH, METRICS_PORT
+
+# ==== Stage Spans ====
+# Every pipeline stage (MarkItDown, LlamaParse, reorganize, RAG, chart rendering, ...) records a
+# timing span with its backend, input size and token usage. Spans feed the Prometheus metrics,
+# the optional JSONL trace log and the in-app profiling panel.
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+SPANS = deque(maxlen=2000)
+_current_span = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_trace_lock = threading.Lock()
+
+_durations = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))   # (stage, backend) -> bucket counts
+_duration_sums = defaultdict(float)
+_counts = defaultdict(int)
+_errors = defaultdict(int)
+_input_bytes = defaultdict(int)
+_tokens = defaultdict(int)                                             # (stage, backend, kind) -> total
+
+@contextmanager
+def span(stage: str, backend: str = None, input_bytes: int = None, **attributes):
+    """Time a pipeline stage; token counts recorded inside it are attached automatically"""
+    record = {"stage": stage, "backend": backend, "input_bytes": input_bytes, **attributes,
+              "start": time.time(), "status": "ok"}
+    token = _current_span.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - started
+        _current_span.reset(token)
+        _finish(record)
+
+def record_span(stage: str, backend: str = None, duration: float = 0.0, **attributes):
+    """Record an already-timed span, for code that cannot be wrapped in span()"""
+    _finish({"stage": stage, "backend": backend, **attributes, "start": time.time() - duration,
+             "duration": duration, "status": "ok"})
+
+def annotate(**attributes):
+    """Add attributes (e.g. prompt_tokens) to the innermost open span, if any"""
+    record = _current_span.get()
+    if record is not None:
+        for key, value in attributes.items():
+            record[key] = record.get(key, 0) + value if isinstance(value, (int, float)) else value
+
+def _finish(record: dict):
+    key = (record["stage"], record["backend"] or "")
+    with _lock:
+        SPANS.append(record)
+        _counts[key] += 1
+        _duration_sums[key] += record["duration"]
+        buckets = _durations[key]
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if record["duration"] <= bound:
+                buckets[i] += 1
+                break
+        else:
+            buckets[-1] += 1
+        if record["status"] == "error":
+            _errors[key] += 1
+        if record.get("input_bytes"):
+            _input_bytes[key] += record["input_bytes"]
+        for kind in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            if record.get(kind):
+                _tokens[key + (kind,)] += record[kind]
+
+    if TRACE_LOG_PATH:
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with _trace_lock:
+            with open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+# ==== Export ====
+
+def _labels(stage: str, backend: str, **extra) -> str:
+    labels = {"stage": stage, "backend": backend, **extra}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+_gauges = {}
+
+def register_gauge(name: str, help_text: str, read, label: str = None):
+    """Export read() as a gauge: a number, or {label value: number} when label is given"""
+    _gauges[name] = (help_text, read, label)
+
+def render_prometheus() -> str:
+    """Prometheus text exposition of the per-stage metrics and registered gauges"""
+    with _lock:
+        lines = ["# HELP pipeline_stage_duration_seconds Duration of pipeline stages",
+                 "# TYPE pipeline_stage_duration_seconds histogram"]
+        for (stage, backend), buckets in sorted(_durations.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                cumulative += count
+                lines.append(f"pipeline_stage_duration_seconds_bucket{_labels(stage, backend, le=bound)} {cumulative}")
+            cumulative += buckets[-1]
+            lines.append(f"pipeline_stage_duration_seconds_bucket{_labels(stage, backend, le='+Inf')} {cumulative}")
+            lines.append(f"pipeline_stage_duration_seconds_sum{_labels(stage, backend)} {_duration_sums[(stage, backend)]:.6f}")
+            lines.append(f"pipeline_stage_duration_seconds_count{_labels(stage, backend)} {_counts[(stage, backend)]}")
+
+        lines += ["# HELP pipeline_stage_errors_total Failed pipeline stage runs",
+                  "# TYPE pipeline_stage_errors_total counter"]
+        lines += [f"pipeline_stage_errors_total{_labels(*key)} {value}" for key, value in sorted(_errors.items())]
+
+        lines += ["# HELP pipeline_stage_input_bytes_total Input bytes processed per stage",
+                  "# TYPE pipeline_stage_input_bytes_total counter"]
+        lines += [f"pipeline_stage_input_bytes_total{_labels(*key)} {value}" for key, value in sorted(_input_bytes.items())]
+
+        lines += ["# HELP pipeline_stage_tokens_total LLM tokens per stage",
+                  "# TYPE pipeline_stage_tokens_total counter"]
+        lines += [f"pipeline_stage_tokens_total{_labels(stage, backend, kind=kind.replace('_tokens', ''))} {value}"
+                  for (stage, backend, kind), value in sorted(_tokens.items())]
+
+    for name, (help_text, read, label) in sorted(_gauges.items()):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        value = read()
+        if label:
+            lines += [f'{name}{{{label}="{key}"}} {number}' for key, number in value.items()]
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def stage_summary() -> list[dict]:
+    """Per-stage count, mean, p50 and p95 duration over the recent spans"""
+    with _lock:
+        spans = list(SPANS)
+    by_stage = defaultdict(list)
+    for record in spans:
+        by_stage[(record["stage"], record["backend"] or "")].append(record["duration"])
+    rows = []
+    for (stage, backend), durations in sorted(by_stage.items()):
+        durations.sort()
+        rows.append({
+            "stage": stage,
+            "backend": backend,
+            "count": len(durations),
+            "mean_s": round(sum(durations) / len(durations), 3),
+            "p50_s": round(durations[int(0.50 * (len(durations) - 1))], 3),
+            "p95_s": round(durations[int(0.95 * (len(durations) - 1))], 3),
+        })
+    return rows
+
+_metrics_server = None
+
+def start_metrics_server(port: int | None = METRICS_PORT):
+    """Serve /metrics on a background thread (once per process); no-op without a port"""
+    global _metrics_server
+    if not port or _metrics_server is not None:
+        return _metrics_server or None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+            except OSError as e:
+                # Another process (e.g. a second Streamlit worker) already serves this port
+                print(f"[⚠️] Metrics server not started on port {port}: {e}")
+                _metrics_server = False
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            print(f"[📈] Prometheus metrics on :{port}/metrics")
+    return _metrics_server
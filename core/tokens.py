@@ -0,0 +1,96 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from .config import LLM_MODEL, MODEL_LIMITS, DEFAULT_MODEL_LIMITS
+
+# ==== Token Counting ====
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str = LLM_MODEL):
+    """Return the tiktoken encoder for a model, built once per model (tiktoken is imported on first use)"""
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Models newer than the installed tiktoken (e.g. gpt-4.1*) use o200k_base
+        return tiktoken.get_encoding("o200k_base")
+
+_counts = OrderedDict()
+_counts_lock = threading.Lock()
+_COUNTS_MAX = 256
+
+def count_tokens(content: str, model=LLM_MODEL):
+    """Count tokens in the content.
+
+    Counts are memoized by content hash, so repeated counts of the same document
+    (e.g. on every Streamlit rerun) never re-encode it.
+    """
+    key = (model, hashlib.sha1(content.encode("utf-8")).hexdigest())
+    with _counts_lock:
+        token_count = _counts.get(key)
+        if token_count is not None:
+            _counts.move_to_end(key)
+            return token_count
+
+    token_count = len(get_encoder(model).encode(content))
+    with _counts_lock:
+        _counts[key] = token_count
+        while len(_counts) > _COUNTS_MAX:
+            _counts.popitem(last=False)
+    print(f"The Size of the Content_Tokens: {token_count}")
+    return token_count
+
+class TokenCounter:
+    """Incremental token count for text that grows by appended pieces (e.g. streamed output)"""
+
+    def __init__(self, model: str = LLM_MODEL):
+        self.encoder = get_encoder(model)
+        self.total = 0
+
+    def add(self, piece: str) -> int:
+        self.total += len(self.encoder.encode(piece))
+        return self.total
+
+def truncate_to_tokens(content: str, max_tokens: int, model: str = LLM_MODEL) -> str:
+    """Cut content down to at most max_tokens tokens"""
+    enc = get_encoder(model)
+    tokens = enc.encode(content)
+    if len(tokens) <= max_tokens:
+        return content
+    return enc.decode(tokens[:max_tokens])
+
+# ==== Budget Planning ====
+
+def model_limits(model: str = LLM_MODEL) -> dict:
+    """Context window and max output tokens for a model"""
+    return MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+
+def plan_request(content_tokens: int, prompt_tokens: int, output_tokens: int, model: str = LLM_MODEL,
+                 can_chunk: bool = False, can_map_reduce: bool = False) -> dict:
+    """Check prompt + content + expected output against the model limits and pick a strategy.
+
+    Strategies: "direct" (fits as is), "chunk" (send retrieved chunks), "map_reduce" (process
+    sections separately) or "truncate" (cut content to what fits).
+    """
+    limits = model_limits(model)
+    fits = (prompt_tokens + content_tokens + output_tokens <= limits["context"]
+            and output_tokens <= limits["max_output"])
+    if fits:
+        strategy = "direct"
+    elif can_chunk:
+        strategy = "chunk"
+    elif can_map_reduce:
+        strategy = "map_reduce"
+    else:
+        strategy = "truncate"
+    available = limits["context"] - prompt_tokens - min(output_tokens, limits["max_output"])
+    return {
+        "strategy": strategy,
+        "content_tokens": content_tokens,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "context_limit": limits["context"],
+        "max_content_tokens": max(0, available),
+    }
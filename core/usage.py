@@ -0,0 +1,38 @@
+import threading
+from collections import deque
+
+from .telemetry import annotate
+
+# ==== Token Usage ====
+# Provider-reported token counts per completion, including prompt-prefix cache hits.
+
+USAGE_LOG = deque(maxlen=1000)
+_totals = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+_lock = threading.Lock()
+
+def record_usage(stage: str, usage) -> dict | None:
+    """Record the usage block of an OpenAI completion (or final stream chunk)"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    entry = {
+        "stage": stage,
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0,
+        "completion_tokens": usage.completion_tokens or 0,
+    }
+    annotate(prompt_tokens=entry["prompt_tokens"], cached_tokens=entry["cached_tokens"],
+             completion_tokens=entry["completion_tokens"])
+    with _lock:
+        USAGE_LOG.append(entry)
+        _totals["calls"] += 1
+        for key in ("prompt_tokens", "cached_tokens", "completion_tokens"):
+            _totals[key] += entry[key]
+    print(f"[📈] {stage}: {entry['prompt_tokens']} prompt ({entry['cached_tokens']} cached), "
+          f"{entry['completion_tokens']} completion tokens")
+    return entry
+
+def usage_totals() -> dict:
+    """Process-wide token totals since start-up"""
+    with _lock:
+        return dict(_totals)
@@ -0,0 +1,79 @@
+import bisect
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from .config import VIEWER_PAGE_CHARS
+from .retrieval import HEADING_RE
+
+# ==== Document Viewer Index ====
+# Large documents are shown one page at a time. Pages, headings and search hits are all
+# character offsets into the text, so the UI only ever sends the visible window.
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 32
+
+def build_page_index(text: str, page_chars: int = VIEWER_PAGE_CHARS) -> dict:
+    """Offsets of pages (broken at headings or blank lines near page_chars) and of headings.
+
+    Returns {"pages": [(start, end)], "starts": [start], "headings": [(level, title, offset)]}.
+    Fenced code blocks are never split across pages, even when one outgrows a page.
+    """
+    pages, headings = [], []
+    start = offset = 0
+    in_fence = False
+    for line in text.split("\n"):
+        size = offset - start
+        fence = line.lstrip().startswith("```")
+        if fence:
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_RE.match(line)
+        if heading:
+            headings.append((len(heading.group(1)), heading.group(2).strip(), offset))
+        boundary = not in_fence and (heading or not line.strip())
+        forced = not in_fence and not fence and size >= 2 * page_chars   # a long run without boundaries
+        if size and ((size >= page_chars and boundary) or forced):
+            pages.append((start, offset))
+            start = offset
+        offset += len(line) + 1
+    if start < len(text) or not pages:
+        pages.append((start, len(text)))
+    return {"pages": pages, "starts": [s for s, _ in pages], "headings": headings}
+
+def get_page_index(text: str) -> dict:
+    """build_page_index(), memoized by content so reruns do not rescan the document"""
+    key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = build_page_index(text)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+def page_of(index: dict, offset: int) -> int:
+    """Zero-based page containing a character offset"""
+    return max(0, bisect.bisect_right(index["starts"], offset) - 1)
+
+def page_text(text: str, index: dict, page: int) -> str:
+    start, end = index["pages"][page]
+    return text[start:end]
+
+def search_document(text: str, index: dict, query: str, limit: int = 50, context: int = 60) -> list[dict]:
+    """Case-insensitive matches with their page and a one-line snippet"""
+    if not query.strip():
+        return []
+    hits = []
+    for match in re.finditer(re.escape(query.strip()), text, re.IGNORECASE):
+        start = max(0, match.start() - context)
+        snippet = text[start:match.end() + context].replace("\n", " ")
+        hits.append({"offset": match.start(), "page": page_of(index, match.start()),
+                     "snippet": ("…" if start else "") + snippet + "…"})
+        if len(hits) >= limit:
+            break
+    return hits
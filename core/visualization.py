@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .config import FIGURE_CACHE_SIZE
+from .telemetry import span
+
+# ==== Visualization ====
+# Figures are memoized by a hash of their chart data and rendered under a stable key, so a
+# rerun sends the same element and the browser keeps the existing chart instead of rebuilding it.
+
+_figures = OrderedDict()
+_figures_lock = threading.Lock()
+
+def chart_hash(chart_data: dict) -> str:
+    return hashlib.sha256(json.dumps(chart_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+def create_visualization(chart_data: dict, unique_key: str = None):
+    """Create visualization based on chart data; unique_key defaults to the chart's content hash"""
+    if not chart_data:
+        return
+    
+    import streamlit as st
+    
+    key = chart_hash(chart_data)
+    with _figures_lock:
+        fig = _figures.get(key)
+        if fig is not None:
+            _figures.move_to_end(key)
+    if fig is None:
+        with span("chart", backend="plotly", chart_type=chart_data.get("type")):
+            fig = _build_figure(chart_data)
+        if fig is None:
+            return
+        with _figures_lock:
+            _figures[key] = fig
+            while len(_figures) > FIGURE_CACHE_SIZE:
+                _figures.popitem(last=False)
+    st.plotly_chart(fig, use_container_width=True, key=f"{chart_data.get('type', '').lower()}_{unique_key or key}")
+
+def _build_figure(chart_data: dict):
+    import plotly.express as px
+    
+    chart_type = chart_data.get("type", "").lower()
+    title = chart_data.get("title", "Chart")
+    
+    if chart_type == "pie":
+        labels = chart_data.get("labels", [])
+        values = chart_data.get("values", [])
+        
+        if labels and values:
+            fig = px.pie(
+                values=values,
+                names=labels,
+                title=title,
+                color_discrete_sequence=px.colors.qualitative.Set3
+            )
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+            fig.update_layout(
+                font=dict(size=12),
+                title_font_size=16,
+                showlegend=True
+            )
+            return fig
+    
+    elif chart_type == "bar":
+        x_data = chart_data.get("x", [])
+        y_data = chart_data.get("y", [])
+        
+        if x_data and y_data:
+            fig = px.bar(
+                x=x_data,
+                y=y_data,
+                title=title,
+                color=y_data,
+                color_continuous_scale="viridis"
+            )
+            fig.update_layout(
+                xaxis_title="Categories",
+                yaxis_title="Values",
+                font=dict(size=12),
+                title_font_size=16
+            )
+            return fig
+    
+    elif chart_type == "line":
+        x_data = chart_data.get("x", [])
+        y_data = chart_data.get("y", [])
+        
+        if x_data and y_data:
+            fig = px.line(
+                x=x_data,
+                y=y_data,
+                title=title,
+                markers=True
+            )
+            fig.update_layout(
+                xaxis_title="X-axis",
+                yaxis_title="Y-axis",
+                font=dict(size=12),
+                title_font_size=16
+            )
+            return fig
+    return None
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def offline_token_counts(monkeypatch):
+    """Count words instead of tokens, so tests never download the tiktoken encoding"""
+    monkeypatch.setattr("core.compaction.count_tokens", lambda text: len(text.split()))
@@ -0,0 +1,123 @@
+import threading
+import time
+
+from core.clients import RequestScheduler, SingleFlight, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_token_bucket_refills_evenly():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)     # one unit per second
+    bucket.take(60)
+    assert bucket.wait_time(1) == 1.0
+    clock.now = 10.0
+    assert bucket.wait_time(10) == 0.0
+    assert bucket.wait_time(15) == 5.0
+
+
+def test_token_bucket_holds_at_most_a_minute():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    clock.now = 600.0
+    bucket.take(60)
+    assert bucket.wait_time(1) == 1.0
+    assert bucket.wait_time(1000) == 60.0   # larger than the bucket: waits for a full one
+
+
+def test_scheduler_waits_for_the_token_budget():
+    clock = FakeClock()
+    scheduler = RequestScheduler(4, rpm=600, tpm=6000, clock=clock)
+    scheduler.acquire(tokens=6000, session="a")
+    scheduler.release()
+    assert scheduler._wait_time(1000) == 10.0
+    clock.now = 10.0
+    scheduler.acquire(tokens=1000, session="a")     # admitted without blocking
+    assert scheduler.in_flight == 1
+
+
+def test_scheduler_pause_holds_every_request():
+    clock = FakeClock()
+    scheduler = RequestScheduler(4, clock=clock)
+    scheduler.pause(30)
+    assert scheduler._wait_time(0) == 30.0
+    clock.now = 30.0
+    assert scheduler._wait_time(0) == 0.0
+
+
+def test_scheduler_interleaves_sessions():
+    scheduler = RequestScheduler(1)
+    scheduler.acquire(session="holder")
+    order, threads = [], []
+
+    def request(session: str):
+        scheduler.acquire(session=session)
+        order.append(session)
+        scheduler.release()
+
+    # A burst from one session, queued before another session's requests
+    for session in ["a", "a", "a", "b", "b"]:
+        queued = sum(len(queue) for queue in scheduler._queues.values())
+        threads.append(threading.Thread(target=request, args=(session,)))
+        threads[-1].start()
+        wait_until(lambda: sum(len(queue) for queue in scheduler._queues.values()) == queued + 1)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["a", "b", "a", "b", "a"]
+
+
+def test_single_flight_makes_one_call_for_concurrent_identical_keys():
+    flights, started, release = SingleFlight(), threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", call)))
+    leader.start()
+    started.wait(5)
+    entered = []
+
+    def follow():
+        entered.append(1)
+        results.append(flights.do("key", call))
+
+    followers = [threading.Thread(target=follow) for _ in range(4)]
+    for follower in followers:
+        follower.start()
+    wait_until(lambda: len(entered) == 4)
+    time.sleep(0.05)    # followers are waiting on the leader's call
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(results) == [("answer", False)] + [("answer", True)] * 4
+    assert not flights.in_flight("key")
+
+
+def test_single_flight_runs_keys_separately_and_forgets_failures():
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == (1, False)
+    assert flights.do("b", lambda: 2) == (2, False)
+    try:
+        flights.do("a", lambda: 1 / 0)
+    except ZeroDivisionError:
+        pass
+    assert flights.do("a", lambda: 3) == (3, False)     # a failed call is not cached
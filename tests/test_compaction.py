@@ -0,0 +1,74 @@
+from core.compaction import compact_text, original_offset
+
+
+def pages(*bodies: str) -> str:
+    return "\n".join(f"<!-- page {i} -->\n{body}" for i, body in enumerate(bodies, 1))
+
+
+def test_per_page_facts_are_kept():
+    text = pages(*(f"ACME Annual Report\n# Chapter {n}\nHeadcount: {n * 10}\nNotes: see appendix {n}\nPage {n} of 4"
+                   for n in range(1, 5)))
+    compacted = compact_text(text)["text"]
+    for n in range(1, 5):
+        assert f"# Chapter {n}" in compacted
+        assert f"Headcount: {n * 10}" in compacted
+        assert f"Notes: see appendix {n}" in compacted
+        assert f"Page {n} of 4" not in compacted
+
+
+def test_bare_page_numbers_are_dropped():
+    result = compact_text(pages(*(f"Body of page {n}.\n{n}" for n in range(1, 5))))
+    assert result["removed"]["page_numbers"] == 4
+    assert result["text"] == "\n".join(f"<!-- page {n} -->\nBody of page {n}." for n in range(1, 5))
+
+
+def test_numeric_data_lines_near_page_edges_are_kept():
+    result = compact_text(pages("Revenue\n120\n2023", "Revenue\n340\n2024"))
+    assert result["removed"]["page_numbers"] == 0
+    for number in ("120", "340", "2023", "2024"):
+        assert number in result["text"].splitlines()
+
+
+def test_running_header_is_kept_once():
+    text = pages(*(f"ACME Annual Report\nSection {n} body text.\nConfidential" for n in range(1, 5)))
+    result = compact_text(text)
+    assert result["text"].count("ACME Annual Report") == 1
+    assert result["text"].count("Confidential") == 1
+    assert all(f"Section {n} body text." in result["text"] for n in range(1, 5))
+
+
+def test_repeated_heading_is_not_a_running_header():
+    text = pages(*(f"## Summary\nQuarter {n} results." for n in range(1, 5)))
+    assert compact_text(text)["text"].count("## Summary") == 4
+
+
+def test_dash_lines_are_not_table_borders():
+    assert compact_text("-\n--")["text"] == "-\n--"
+
+
+def test_repeated_table_border_is_dropped():
+    text = "| a | b |\n|---|---|\n| --- | --- |\n| 1 | 2 |"
+    result = compact_text(text)
+    assert result["text"] == "| a | b |\n| --- | --- |\n| 1 | 2 |"
+    assert result["removed"]["table_borders"] == 1
+
+
+def test_duplicate_long_block_is_dropped():
+    block = "This paragraph is repeated boilerplate that appears twice in the extracted document text."
+    result = compact_text(f"{block}\n\nUnique text.\n\n{block}")
+    assert result["text"] == f"{block}\n\nUnique text."
+    assert result["removed"]["duplicate_blocks"] == 1
+
+
+def test_fenced_code_is_untouched():
+    code = "```\nx  =  1\n\n\n|---|\n|---|\n```"
+    assert compact_text(code)["text"] == code
+
+
+def test_offsets_map_back_to_the_extracted_text():
+    text = pages(*(f"ACME Annual Report\nSection {n}  body   text.\nPage {n} of 4" for n in range(1, 5)))
+    result = compact_text(text)
+    assert result["original_text"] == text
+    for n in range(1, 5):
+        offset = original_offset(result, result["text"].index(f"Section {n}"))
+        assert text[offset:].startswith(f"Section {n}")
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from core.retrieval import DocumentIndex
+from core.store import DocumentStore, document_id, workspace_owner
+
+ALICE, BOB = "user:alice@example.com", workspace_owner("team")
+
+
+def index(text: str) -> DocumentIndex:
+    return DocumentIndex([{"heading": "Intro", "text": text, "tokens": len(text.split())}],
+                         np.ones((1, 4), dtype=np.float32))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(str(tmp_path))
+    # The same file uploaded by both owners
+    for owner in (ALICE, BOB):
+        doc_id = document_id(owner, "same-file")
+        store.save_document(owner, doc_id, f"{owner}.pdf", f"text of {owner}", index(f"chunk of {owner}"))
+        store.add_qa(doc_id, {"question": "q", "answer": f"answer for {owner}", "timestamp": 1.0})
+    return store
+
+
+def test_same_file_gets_one_document_per_owner():
+    assert document_id(ALICE, "same-file") != document_id(BOB, "same-file")
+
+
+def test_list_returns_only_the_owners_documents(store):
+    assert [doc["name"] for doc in store.list_documents(ALICE)] == [f"{ALICE}.pdf"]
+    assert [doc["name"] for doc in store.list_documents(BOB)] == [f"{BOB}.pdf"]
+    assert store.list_documents("user:mallory") == []
+
+
+def test_load_refuses_another_owners_document(store):
+    alice_doc = document_id(ALICE, "same-file")
+    assert store.load_document(BOB, alice_doc) is None
+    document = store.load_document(ALICE, alice_doc)
+    assert document["raw_text"] == f"text of {ALICE}"
+    assert [entry["answer"] for entry in document["qa_history"]] == [f"answer for {ALICE}"]
+
+
+def test_combined_index_skips_another_owners_documents(store):
+    combined = store.combined_index(ALICE, [document_id(ALICE, "same-file"), document_id(BOB, "same-file")])
+    assert [chunk["text"] for chunk in combined.chunks] == [f"chunk of {ALICE}"]
+    assert combined.embeddings.shape == (1, 4)
+
+
+def test_delete_leaves_another_owners_document(store):
+    bob_doc = document_id(BOB, "same-file")
+    store.delete_document(ALICE, bob_doc)
+    assert store.load_document(BOB, bob_doc) is not None
+    assert store.load_index(bob_doc) is not None
+
+    store.delete_document(BOB, bob_doc)
+    assert store.list_documents(BOB) == []
+    assert store.load_document(ALICE, document_id(ALICE, "same-file")) is not None